@@ -1,16 +1,57 @@
 import requests
+from utils import get_session, get_download_session
 import json
 import os
+import hashlib
 from typing import Dict, List, Optional
 import time
+import tarfile
+import zipfile
+import tempfile
+import threading
+from download_manager import DownloadError
+from skin_image import normalize_skin, SkinImageError
+
+# Результаты upload_skin (оба истинны, неудача - False)
+UPLOAD_OK = "uploaded"
+UPLOAD_UNCHANGED = "unchanged"
+
+
+class SkinSyncSession:
+    """Один проход синхронизации скинов.
+
+    Манифест запрашивается один раз на весь проход, а запасные
+    статические URL скинов заранее собираются в словарь по имени.
+    """
+    def __init__(self, base_url, manifest):
+        self.manifest = manifest or {"skins": {}}
+        self.skins = self.manifest.get('skins', {})
+        self.static_urls = {
+            username: f"{base_url}/uploads/skins/{info.get('filename', f'{username}.png')}"
+            for username, info in self.skins.items()
+        }
+
+    def static_url(self, username):
+        return self.static_urls.get(username)
+
 
 class APIClient:
+    UPLOAD_WORKERS = 4  # Небольшой сервер: не больше стольких загрузок одновременно
+
     def __init__(self, launcher):
         self.launcher = launcher
+        self.session = get_session()
         self.base_url = "https://JIeJLMeHb.pythonanywhere.com"
         self.api_key = ""
         self.username = ""
+        self.auto_upload_skin = False
         self.config_file = "api_config.json"
+        # Последний манифест скинов с ETag и ревизией для условных запросов
+        self.skins_manifest_path = os.path.join(launcher.SYNC_DIR, "skins_manifest.json")
+        self._skins_manifest_lock = threading.Lock()
+        self._skins_manifest_cache = None
+        # Скачанные архивы модпаков: серверные размер/хэши и локальный stat
+        self.modpacks_state_path = os.path.join(launcher.SYNC_DIR, "modpacks_state.json")
         self.load_config()
 
     def log(self, message):
@@ -32,6 +73,7 @@ class APIClient:
             
             self.api_key = config.get('api_key', '')
             self.username = config.get('username', '')
+            self.auto_upload_skin = bool(config.get('auto_upload_skin', False))
             
             new_base_url = config.get('base_url', '')
             if new_base_url and new_base_url != self.base_url:
@@ -62,7 +104,8 @@ class APIClient:
             config = {
                 'api_key': self.api_key,
                 'username': self.username,
-                'base_url': self.base_url
+                'base_url': self.base_url,
+                'auto_upload_skin': self.auto_upload_skin
             }
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=2)
@@ -76,7 +119,7 @@ class APIClient:
                 self.log("Имя пользователя и пароль не могут быть пустыми")
                 return False
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/auth/register",
                 params={"username": username, "password": password},
                 timeout=10
@@ -109,7 +152,7 @@ class APIClient:
                 self.log("Имя пользователя и пароль не могут быть пустыми")
                 return False
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/auth/login",
                 params={"username": username, "password": password},
                 timeout=10
@@ -135,8 +178,13 @@ class APIClient:
             self.log(f"Исключение при входе: {str(e)}")
             return False
     
-    def upload_skin(self, skin_path, username=None):
-        """Загружает скин на сервер"""
+    def upload_skin(self, skin_path, username=None, force=False):
+        """Загружает скин на сервер.
+        
+        Если md5 подготовленного PNG совпадает с хэшем в сохраненном манифесте
+        скинов, запрос не отправляется. Возвращает UPLOAD_OK, UPLOAD_UNCHANGED
+        или False.
+        """
         try:
             if not self.api_key:
                 self.log("Необходимо сначала войти или зарегистрироваться")
@@ -159,19 +207,34 @@ class APIClient:
                 self.log(f"Неподдерживаемый формат файла: {file_ext}")
                 return False
             
+            # На сервер уходит проверенный и пережатый PNG без метаданных
             with open(skin_path, 'rb') as f:
-                files = {'file': (os.path.basename(skin_path), f, f'image/{file_ext[1:]}')}
-                headers = {'Authorization': f'Bearer {self.api_key}'}
-                
-                response = requests.post(
-                    f"{self.base_url}/api/skins/upload?username={username}",
-                    files=files,
-                    headers=headers,
-                    timeout=30
-                )
+                original = f.read()
+            try:
+                skin_data = normalize_skin(original)
+            except SkinImageError as e:
+                self.log(f"Файл не подходит как скин: {str(e)}")
+                return False
+            skin_md5 = hashlib.md5(skin_data).hexdigest()
+            if not force and self._known_skin_hash(username) == skin_md5:
+                return UPLOAD_UNCHANGED
+            if len(skin_data) < len(original):
+                self.log(f"Скин пережат: {len(original)} -> {len(skin_data)} байт")
+            
+            files = {'file': (f"{os.path.splitext(os.path.basename(skin_path))[0]}.png",
+                              skin_data, 'image/png')}
+            headers = {'Authorization': f'Bearer {self.api_key}'}
+            
+            response = self.session.post(
+                f"{self.base_url}/api/skins/upload?username={username}",
+                files=files,
+                headers=headers,
+                timeout=30
+            )
             
             if response.status_code == 200:
-                return True
+                self._remember_skin_hash(username, skin_md5, len(skin_data))
+                return UPLOAD_OK
             elif response.status_code == 401:
                 self.log("Неверный API ключ. Войдите заново")
                 self.api_key = ""
@@ -196,64 +259,266 @@ class APIClient:
             self.log(f"Исключение при загрузке: {str(e)}")
             return False
 
+    def upload_skins_batch(self, skins, max_workers=None):
+        """Загрузка скинов многих пользователей (для администратора).
+        
+        skins - {имя пользователя: путь к файлу}. Одновременно идет не больше
+        max_workers (по умолчанию UPLOAD_WORKERS) запросов, неизменившиеся
+        скины пропускаются. Возвращает отчет со списками имен.
+        """
+        report = {'uploaded': [], 'unchanged': [], 'failed': []}
+        
+        def upload(item):
+            username, skin_path = item
+            result = self.upload_skin(skin_path, username)
+            if result:
+                report['unchanged' if result == UPLOAD_UNCHANGED else 'uploaded'].append(username)
+            return result
+        
+        results = self.launcher.download_manager.run_parallel(
+            sorted(skins.items()), upload, max_workers=max_workers or self.UPLOAD_WORKERS)
+        report['failed'] = [username for (username, _), _ in results['failed']]
+        for names in report.values():
+            names.sort()
+        
+        self.log(f"Пакетная загрузка скинов: загружено {len(report['uploaded'])}, "
+                 f"без изменений {len(report['unchanged'])}, ошибок {len(report['failed'])}")
+        return report
+
+    def _known_skin_hash(self, username):
+        """Хэш скина пользователя из сохраненного манифеста (без запроса к серверу)"""
+        with self._skins_manifest_lock:
+            cached = self._load_skins_manifest_cache()
+        if not cached:
+            return None
+        return cached['manifest'].get('skins', {}).get(username, {}).get('hash')
+
+    def _remember_skin_hash(self, username, skin_md5, size):
+        """После загрузки сервер хранит ровно этот PNG - обновляем манифест локально"""
+        with self._skins_manifest_lock:
+            cached = self._load_skins_manifest_cache()
+            if not cached:
+                return
+            skins = cached['manifest'].setdefault('skins', {})
+            entry = dict(skins.get(username, {}), hash=skin_md5, size=size)
+            entry.setdefault('filename', f"{username}.png")
+            skins[username] = entry
+
     def get_skins_manifest(self):
-        """Получает манифест всех скинов с сервера"""
+        """Получает манифест всех скинов с сервера.
+        
+        Последний манифест хранится локально вместе с ETag и ревизией:
+        неизменившийся манифест стоит одного ответа 304, а сервер с
+        поддержкой ?since=<ревизия> присылает только изменения
+        ({'revision', 'changes', 'removed'}).
+        """
+        # Блокировка только на чтение/запись кэша, не на время запроса
+        with self._skins_manifest_lock:
+            cached = self._load_skins_manifest_cache()
+        fallback = cached['manifest'] if cached else {"skins": {}}
         try:
-            response = requests.get(
-                f"{self.base_url}/api/skins/manifest",
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"skins": {}}
+            headers = {}
+            params = {}
+            if cached:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached['manifest'].get('revision') is not None:
+                    params['since'] = cached['manifest']['revision']
+            
+            url = f"{self.base_url}/api/skins/manifest"
+            response = self.session.get(url, headers=headers, params=params, timeout=10)
+            if params and response.status_code not in (200, 304):
+                # Сервер не понял дельта-запрос - берем манифест целиком
+                response = self.session.get(url, timeout=10)
+            
+            if response.status_code == 304 and cached:
+                return cached['manifest']
+            
+            if response.status_code != 200:
+                # Локальная копия лучше пустого манифеста: иначе все скины считались бы удаленными
+                self.log(f"Манифест скинов недоступен (HTTP {response.status_code}), используется сохраненный")
+                return fallback
+            
+            data = response.json()
+            with self._skins_manifest_lock:
+                if 'changes' in data and cached:
+                    # Изменения с нашей ревизии накладываются на самый свежий кэш
+                    latest = self._load_skins_manifest_cache() or cached
+                    manifest = self._apply_skins_delta(latest['manifest'], data)
+                else:
+                    manifest = data
+                self._save_skins_manifest_cache(manifest, response.headers.get('ETag'))
+            return manifest
                 
         except Exception as e:
             self.log(f"Исключение при получении манифеста: {str(e)}")
-            return {"skins": {}}
+            return fallback
+
+    def _apply_skins_delta(self, manifest, delta):
+        """Накладывает ответ ?since=<ревизия> на сохраненный манифест"""
+        skins = dict(manifest.get('skins', {}))
+        skins.update(delta.get('changes', {}))
+        for username in delta.get('removed', []):
+            skins.pop(username, None)
+        return dict(manifest, skins=skins, revision=delta.get('revision'))
+
+    def _load_skins_manifest_cache(self):
+        """Сохраненный манифест для текущего сервера или None"""
+        if self._skins_manifest_cache is None:
+            try:
+                with open(self.skins_manifest_path, 'r', encoding='utf-8') as f:
+                    self._skins_manifest_cache = json.load(f)
+            except (OSError, ValueError):
+                self._skins_manifest_cache = {}
+        
+        cached = self._skins_manifest_cache
+        if cached.get('base_url') != self.base_url or not isinstance(cached.get('manifest'), dict):
+            return None
+        return cached
 
-    def download_skin(self, username, dest_path):
-        """Скачивает скин по имени пользователя"""
+    def _save_skins_manifest_cache(self, manifest, etag):
+        self._skins_manifest_cache = {'base_url': self.base_url, 'etag': etag, 'manifest': manifest}
+        try:
+            os.makedirs(os.path.dirname(self.skins_manifest_path), exist_ok=True)
+            tmp_path = self.skins_manifest_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._skins_manifest_cache, f, ensure_ascii=False)
+            os.replace(tmp_path, self.skins_manifest_path)
+        except OSError as e:
+            self.log(f"Не удалось сохранить манифест скинов: {str(e)}")
+
+    def start_skin_sync(self):
+        """Начинает проход синхронизации с одним общим манифестом"""
+        return SkinSyncSession(self.base_url, self.get_skins_manifest())
+
+    def download_skin(self, username, dest_path, session=None):
+        """Скачивает скин по имени пользователя.
+        
+        session (SkinSyncSession) - манифест текущего прохода для запасного
+        пути; без него манифест запрашивается заново.
+        """
         try:
             # Пробуем через API эндпоинт
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/api/skins/{username}",
                 timeout=10
             )
             
             if response.status_code == 200:
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                
-                with open(dest_path, 'wb') as f:
-                    f.write(response.content)
-                
+                self._write_file(dest_path, response.content)
                 return True
             else:
                 # Пробуем через манифест
-                manifest = self.get_skins_manifest()
-                if manifest and username in manifest.get('skins', {}):
-                    skin_info = manifest['skins'][username]
-                    filename = skin_info.get('filename', f"{username}.png")
-                    
-                    static_url = f"{self.base_url}/uploads/skins/{filename}"
-                    response = requests.get(static_url, timeout=10)
+                if session is None:
+                    session = self.start_skin_sync()
+                static_url = session.static_url(username)
+                if static_url:
+                    response = self.session.get(static_url, timeout=10)
                     if response.status_code == 200:
-                        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                        with open(dest_path, 'wb') as f:
-                            f.write(response.content)
+                        self._write_file(dest_path, response.content)
                         return True
             
             return False
             
         except Exception as e:
-            self.log(f"Исключение при скачивании скина: {str(e)}")
+            self.log(f"Исключение при скачивании скина {username}: {str(e)}")
             return False
 
+    def _write_file(self, dest_path, content):
+        """Атомарная запись скина в том виде, в каком его отдал сервер.
+        
+        md5 файла на диске совпадает с хэшем из манифеста, поэтому проверка
+        актуальности не зависит от индекса; пережимается только копия,
+        которую SkinManager кладет в папку CSL.
+        """
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = dest_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, dest_path)
+        
+        skin_manager = getattr(self.launcher, 'skin_manager', None)
+        if skin_manager:
+            skin_manager.record_skin(dest_path, hashlib.md5(content).hexdigest())
+
+    def download_skins_archive(self, dest_dir, usernames=None, batch=None):
+        """Скачивает скины одним архивом (tar или zip) и распаковывает на лету.
+        
+        usernames=None - все скины, иначе только перечисленные.
+        Возвращает множество имен распакованных скинов или None, если
+        сервер не отдает архив (тогда скины качаются по одному).
+        """
+        try:
+            url = f"{self.base_url}/api/skins/archive"
+            headers = {'Accept': 'application/x-tar, application/zip'}
+            if usernames is None:
+                response = self.session.get(url, headers=headers, stream=True, timeout=30)
+            else:
+                response = self.session.post(url, json={'usernames': sorted(usernames)},
+                                             headers=headers, stream=True, timeout=30)
+            
+            with response:
+                if response.status_code != 200:
+                    return None
+                
+                wanted = set(usernames) if usernames is not None else None
+                content_type = response.headers.get('Content-Type', '')
+                response.raw.decode_content = True
+                if 'zip' in content_type:
+                    return self._extract_skins_zip(response, dest_dir, wanted, batch)
+                return self._extract_skins_tar(response.raw, dest_dir, wanted, batch)
+                
+        except Exception as e:
+            self.log(f"Архив скинов недоступен: {str(e)}")
+            return None
+
+    def _archive_skin_name(self, member_name, wanted):
+        """Имя пользователя для элемента архива или None, если элемент не нужен"""
+        filename = os.path.basename(member_name.replace('\\', '/'))
+        username, ext = os.path.splitext(filename)
+        if ext.lower() != '.png' or not username:
+            return None
+        if wanted is not None and username not in wanted:
+            return None
+        return username
+
+    def _extract_skins_tar(self, stream, dest_dir, wanted, batch=None):
+        """Потоковая распаковка tar: каждый скин пишется сразу по мере чтения"""
+        extracted = set()
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for member in archive:
+                username = self._archive_skin_name(member.name, wanted)
+                if not member.isfile() or username is None:
+                    continue
+                content = archive.extractfile(member).read()
+                self._write_file(os.path.join(dest_dir, f"{username}.png"), content)
+                if batch:
+                    batch.add_bytes(len(content))
+                extracted.add(username)
+        return extracted
+
+    def _extract_skins_zip(self, response, dest_dir, wanted, batch=None):
+        """zip требует произвольного доступа: сначала во временный файл, потом распаковка"""
+        extracted = set()
+        with tempfile.TemporaryFile() as spool:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                spool.write(chunk)
+                if batch:
+                    batch.add_bytes(len(chunk))
+            spool.seek(0)
+            with zipfile.ZipFile(spool) as archive:
+                for info in archive.infolist():
+                    username = self._archive_skin_name(info.filename, wanted)
+                    if info.is_dir() or username is None:
+                        continue
+                    self._write_file(os.path.join(dest_dir, f"{username}.png"), archive.read(info))
+                    extracted.add(username)
+        return extracted
+
     def get_available_skins(self):
         """Получить список всех скинов на сервере"""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/api/skins",
                 timeout=10
             )
@@ -271,9 +536,10 @@ class APIClient:
     def test_connection(self):
         """Проверяет соединение с сервером"""
         try:
-            response = requests.get(
+            # Вызывается из потока Tk: одна попытка без повторов адаптера
+            response = get_download_session().get(
                 f"{self.base_url}/api/health",
-                timeout=5
+                timeout=(3, 5)
             )
             
             if response.status_code == 200:
@@ -291,7 +557,7 @@ class APIClient:
     def get_server_stats(self):
         """Получает статистику сервера"""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/api/stats",
                 timeout=10
             )
@@ -321,7 +587,7 @@ class APIClient:
                 return False
             
             headers = {'Authorization': f'Bearer {self.api_key}'}
-            response = requests.delete(
+            response = self.session.delete(
                 f"{self.base_url}/api/skins/{username}",
                 headers=headers,
                 timeout=10
@@ -346,7 +612,7 @@ class APIClient:
     def get_modpacks_list(self):
         """Получает список модпаков с сервера"""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/api/modpacks",
                 timeout=10
             )
@@ -360,15 +626,14 @@ class APIClient:
             self.log(f"Исключение при получении списка модпаков: {str(e)}")
             return []
 
-    def download_modpack(self, modpack_id, dest_dir):
-        """Скачивает модпак"""
+    def download_modpack(self, modpack_id, dest_dir, modpack_info=None):
+        """Скачивает модпак (modpack_info - запись из get_modpacks_list, если уже есть)"""
         try:
-            modpacks = self.get_modpacks_list()
-            modpack_info = None
-            for mp in modpacks:
-                if mp.get('id') == modpack_id:
-                    modpack_info = mp
-                    break
+            if modpack_info is None:
+                for mp in self.get_modpacks_list():
+                    if mp.get('id') == modpack_id:
+                        modpack_info = mp
+                        break
             
             if not modpack_info:
                 self.log(f"Модпак {modpack_id} не найден")
@@ -377,20 +642,67 @@ class APIClient:
             filename = modpack_info.get('filename', f"{modpack_id}.zip")
             url = f"{self.base_url}/uploads/modpacks/{filename}"
             
-            response = requests.get(url, timeout=60, stream=True)
-            if response.status_code == 200:
-                os.makedirs(dest_dir, exist_ok=True)
-                
-                dest_path = os.path.join(dest_dir, filename)
-                with open(dest_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
-                return True
-            else:
-                self.log(f"Ошибка при скачивании модпака: {response.status_code}")
+            dest_path = os.path.join(dest_dir, filename)
+            try:
+                self.launcher.download_manager.download_file(
+                    url, dest_path, timeout=60,
+                    expected_hashes=self._published_hashes(modpack_info))
+            except DownloadError as e:
+                self.log(f"Ошибка при скачивании модпака: {str(e)}")
                 return False
+            
+            self._remember_modpack(dest_path, modpack_info)
+            return True
         except Exception as e:
             self.log(f"Исключение при скачивании модпака: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def is_modpack_current(self, modpack_info, dest_dir):
+        """Архив модпака уже скачан и на сервере с тех пор не менялся"""
+        filename = modpack_info.get('filename', f"{modpack_info.get('id')}.zip")
+        dest_path = os.path.join(dest_dir, filename)
+        record = self._load_modpacks_state().get(os.path.abspath(dest_path))
+        if not record or record['server'] != self._modpack_signature(modpack_info):
+            return False
+        try:
+            stat = os.stat(dest_path)
+        except OSError:
+            return False
+        return [stat.st_size, stat.st_mtime_ns] == record['local']
+
+    def _modpack_signature(self, info):
+        # Без размера и хэшей изменение архива на сервере не определить
+        signature = {'size': info.get('size'), 'hashes': self._published_hashes(info)}
+        return signature if signature['size'] or signature['hashes'] else None
+
+    def _remember_modpack(self, dest_path, modpack_info):
+        signature = self._modpack_signature(modpack_info)
+        state = self._load_modpacks_state()
+        key = os.path.abspath(dest_path)
+        if signature is None:
+            state.pop(key, None)
+        else:
+            stat = os.stat(dest_path)
+            state[key] = {'server': signature, 'local': [stat.st_size, stat.st_mtime_ns]}
+        try:
+            with open(self.modpacks_state_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+        except OSError as e:
+            self.log(f"Не удалось сохранить состояние модпаков: {str(e)}")
+
+    def _load_modpacks_state(self):
+        try:
+            with open(self.modpacks_state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _published_hashes(self, info):
+        """Хэши файла из ответа сервера; 'hash' в манифестах сервера - это md5"""
+        hashes = {}
+        for algo in ('sha256', 'sha1', 'md5'):
+            if info.get(algo):
+                hashes[algo] = info[algo]
+        if info.get('hash') and 'md5' not in hashes:
+            hashes['md5'] = info['hash']
+        return hashes
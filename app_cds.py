@@ -0,0 +1,95 @@
+import os
+import glob
+import json
+import shutil
+import hashlib
+from jvm_tuning import java_major_for
+
+# Динамические архивы (-XX:ArchiveClassesAtExit) появились в JDK 13
+MIN_JAVA_MAJOR = 13
+
+
+class AppCDSArchives:
+    """Архивы классов AppCDS для ускорения старта JVM (включается в модпаке).
+
+    Первый запуск сочетания версии, модпака и папки игры записывает архив
+    при выходе (-XX:ArchiveClassesAtExit), следующие подключают его через
+    -XX:SharedArchiveFile. Имя архива в launcher_cache/cds содержит хэш
+    цепочки version JSON, списка модов и java, так что любое изменение
+    приводит к созданию нового архива, а старый архив того же сочетания
+    удаляется (архивы других модпаков не трогаются).
+    """
+
+    def __init__(self, launcher, cache_dir, launch_plans):
+        self.launcher = launcher
+        self.cds_dir = os.path.join(cache_dir, "cds")
+        self.launch_plans = launch_plans
+
+    def log(self, message):
+        """Логирование через лаунчер"""
+        self.launcher.log(message)
+
+    def prepare(self, command, launch_version, minecraft_version, game_dir, modpack=None):
+        """Добавляет флаги CDS в команду.
+
+        Возвращает (команда, путь архива, который будет записан при выходе,
+        или None).
+        """
+        if java_major_for(minecraft_version) < MIN_JAVA_MAJOR:
+            self.log("AppCDS: для этой версии нужна Java 13+, архив не используется")
+            return command, None
+
+        try:
+            # Модпаки с общей .minecraft и одной версией не должны вытеснять архивы друг друга
+            combo = json.dumps([launch_version, os.path.abspath(game_dir), modpack or ""])
+            combo = hashlib.sha1(combo.encode('utf-8')).hexdigest()[:12]
+            state = self._state_key(command[0], launch_version, game_dir)
+            archive = os.path.abspath(os.path.join(self.cds_dir, f"{combo}-{state}.jsa"))
+
+            if os.path.isfile(archive) and os.path.getsize(archive) > 0:
+                self.log("AppCDS: используется архив классов")
+                return self._with_flag(command, f"-XX:SharedArchiveFile={archive}"), None
+
+            os.makedirs(self.cds_dir, exist_ok=True)
+            for stale in glob.glob(os.path.join(self.cds_dir, f"{combo}-*.jsa")):
+                os.remove(stale)
+            self.log("AppCDS: архив классов будет создан при выходе из игры")
+            return self._with_flag(command, f"-XX:ArchiveClassesAtExit={archive}"), archive
+        except Exception as e:
+            self.log(f"⚠️ AppCDS недоступен: {str(e)}")
+            return command, None
+
+    def finish(self, archive, returncode):
+        """После игры, запущенной с ArchiveClassesAtExit: недописанный архив удаляется"""
+        if not os.path.exists(archive):
+            self.log("AppCDS: архив не создан (JVM его не поддерживает?)")
+            return
+        if returncode != 0:
+            os.remove(archive)
+            self.log("AppCDS: игра завершилась с ошибкой, архив удален")
+            return
+        size_mb = os.path.getsize(archive) / (1024 * 1024)
+        self.log(f"✅ AppCDS: архив классов создан ({size_mb:.1f} МБ)")
+
+    def _state_key(self, java, launch_version, game_dir):
+        java_path = java if os.path.isabs(java) else shutil.which(java)
+        java_state = None
+        if java_path and os.path.exists(java_path):
+            stat = os.stat(java_path)
+            java_state = [os.path.realpath(java_path), stat.st_mtime_ns, stat.st_size]
+
+        mods = []
+        mods_dir = os.path.join(game_dir, "mods")
+        if os.path.isdir(mods_dir):
+            for entry in os.scandir(mods_dir):
+                if entry.name.endswith('.jar'):
+                    stat = entry.stat()
+                    mods.append([entry.name, stat.st_size, stat.st_mtime_ns])
+
+        payload = json.dumps({'versions': self.launch_plans.version_files(launch_version),
+                              'mods': sorted(mods), 'java': java_state}, sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def _with_flag(self, command, flag):
+        # Флаги JVM идут сразу после исполняемого файла java
+        return [command[0], flag] + command[1:]
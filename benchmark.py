@@ -0,0 +1,186 @@
+"""Офлайн-бенчмарки сетевой части лаунчера против заглушек из dev_server.py.
+
+Запуск: python benchmark.py curseforge --files 300 --latency 0.02
+        python benchmark.py sync --skins 10000 --modpacks 20 --latency 0.02
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import requests
+
+import dev_server
+from curseforge_handler import CurseForgeHandler
+from download_manager import DownloadManager
+from mod_store import ModStore
+
+
+class HeadlessLauncher:
+    """Минимальная замена MinecraftLauncher без Tk для бенчмарков"""
+    def __init__(self, root_dir, verbose=False):
+        self.verbose = verbose
+        self.MINECRAFT_DIR = os.path.join(root_dir, ".minecraft")
+        self.MODPACKS_DIR = os.path.join(self.MINECRAFT_DIR, "modpacks")
+        self.MODS_CACHE_DIR = os.path.join(self.MINECRAFT_DIR, "mods_cache")
+        for directory in [self.MODPACKS_DIR, self.MODS_CACHE_DIR]:
+            os.makedirs(directory, exist_ok=True)
+        self.download_manager = DownloadManager(self)
+        self.mod_store = ModStore(self)
+
+    def log(self, message):
+        if self.verbose:
+            print(f"[Bench] {message}")
+
+    def refresh_modpacks_list(self):
+        pass
+
+
+def server_stats(base_url):
+    return requests.get(f"{base_url}/_stats", timeout=5).json()
+
+
+def reset_stats(base_url):
+    requests.post(f"{base_url}/_stats/reset", timeout=5)
+
+
+def bench_curseforge_resolve(file_count=300, latency=0.02, bulk_miss_every=0, verbose=False):
+    """Сравнивает пакетное и поштучное разрешение метаданных файлов манифеста"""
+    app = dev_server.create_curseforge_app(file_count, latency=latency,
+                                           bulk_miss_every=bulk_miss_every)
+    server, base_url = dev_server.serve_in_background(app)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = dev_server.make_manifest(file_count)
+
+            def make_handler(name):
+                handler = CurseForgeHandler(HeadlessLauncher(os.path.join(tmp, name), verbose))
+                handler.CURSEFORGE_API = f"{base_url}/v1"
+                return handler
+
+            def measure(action):
+                reset_stats(base_url)
+                start = time.perf_counter()
+                resolved = action()
+                return {
+                    'seconds': time.perf_counter() - start,
+                    'resolved': len([info for info in resolved if info]),
+                    'requests': server_stats(base_url)['requests']
+                }
+
+            results = {}
+            handler = make_handler("bulk")
+            results['bulk'] = measure(lambda: list(handler.resolve_manifest_files(manifest).values()))
+            # Повторное разрешение тем же лаунчером обслуживается дисковым кэшем
+            cached = make_handler("bulk")
+            results['cached'] = measure(lambda: list(cached.resolve_manifest_files(manifest).values()))
+
+            per_file = make_handler("per_file")
+            results['per_file'] = measure(lambda: [
+                per_file._get_curseforge_file_info(f['projectID'], f['fileID'])
+                for f in manifest['files']])
+
+            return results
+    finally:
+        server.should_exit = True
+
+
+def headless_minecraft_launcher(root_dir, base_url, verbose=False):
+    """MinecraftLauncher без окна: настоящие sync_skins/sync_modpacks против заглушки"""
+    from launcher import MinecraftLauncher
+
+    class HeadlessMinecraftLauncher(MinecraftLauncher):
+        def __init__(self):
+            self.setup_components(os.path.join(root_dir, ".minecraft"))
+            self.api_client.base_url = base_url
+
+        def log(self, message):
+            if verbose:
+                print(f"[Bench] {message}")
+
+        def refresh_modpacks_list(self):
+            pass
+
+    return HeadlessMinecraftLauncher()
+
+
+def bench_sync(skin_count=2000, modpack_count=10, modpack_size=1024 * 1024,
+               changed=20, latency=0.02, archive="tar", verbose=False):
+    """sync_skins и sync_modpacks: холодный старт, повтор без изменений, повтор с изменениями"""
+    app = dev_server.create_sync_app(skin_count, latency=latency, archive=archive,
+                                     modpack_count=modpack_count, modpack_size=modpack_size)
+    server, base_url = dev_server.serve_in_background(app)
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # APIClient читает и пишет api_config.json в текущей папке
+            os.chdir(tmp)
+            launcher = headless_minecraft_launcher(tmp, base_url, verbose)
+
+            def measure(action):
+                reset_stats(base_url)
+                start = time.perf_counter()
+                report = action()
+                row = {'seconds': time.perf_counter() - start}
+                if isinstance(report, dict):
+                    row.update(downloaded=report['downloaded'], skipped=report['skipped'],
+                               failed=len(report['failed']))
+                row.update(server_stats(base_url))
+                return row
+
+            results = {}
+            results['skins_cold'] = measure(launcher.sync_skins)
+            results['skins_warm'] = measure(launcher.sync_skins)
+            for index in range(changed):
+                app.state.touch_skin(f"player{index:05d}")
+            results[f'skins_{changed}_changed'] = measure(launcher.sync_skins)
+
+            results['modpacks_cold'] = measure(launcher.sync_modpacks)
+            results['modpacks_warm'] = measure(launcher.sync_modpacks)
+            return results
+    finally:
+        os.chdir(cwd)
+        server.should_exit = True
+
+
+def print_results(title, results):
+    print(f"== {title} ==")
+    for name, row in results.items():
+        cols = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                         for k, v in row.items())
+        print(f"  {name:<12} {cols}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки сетевой части лаунчера")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    cf = sub.add_parser("curseforge", help="разрешение метаданных манифеста CurseForge")
+    cf.add_argument("--files", type=int, default=300)
+    cf.add_argument("--bulk-miss-every", type=int, default=0)
+
+    sync = sub.add_parser("sync", help="sync_skins / sync_modpacks против заглушки сервера")
+    sync.add_argument("--skins", type=int, default=2000)
+    sync.add_argument("--modpacks", type=int, default=10)
+    sync.add_argument("--modpack-size", type=int, default=1024 * 1024)
+    sync.add_argument("--changed", type=int, default=20)
+    sync.add_argument("--archive", choices=["tar", "zip", ""], default="tar")
+
+    for p in sub.choices.values():
+        p.add_argument("--latency", type=float, default=0.02)
+        p.add_argument("-v", "--verbose", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.bench == "curseforge":
+        print_results("CurseForge resolve",
+                      bench_curseforge_resolve(args.files, args.latency,
+                                               args.bulk_miss_every, args.verbose))
+    elif args.bench == "sync":
+        print_results("Sync",
+                      bench_sync(args.skins, args.modpacks, args.modpack_size, args.changed,
+                                 args.latency, args.archive, args.verbose))
+
+
+if __name__ == "__main__":
+    main()
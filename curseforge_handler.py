@@ -1,20 +1,33 @@
 import os
 import json
 import shutil
-import requests
 import zipfile
+import zlib
 import threading
 from pathlib import Path
 from typing import Dict, List, Optional
 import re
+from metadata_cache import MetadataCache
+from utils import get_session
 
 class CurseForgeHandler:
+    MANIFEST_FILENAME = 'curseforge_manifest.json'  # Last imported manifest, next to modpack_info.json
+    OVERRIDES_FILENAME = 'curseforge_overrides.json'  # Files extracted from overrides/ by the last import
+    
     def __init__(self, launcher):
         self.launcher = launcher
+        self.session = get_session()
         self.CURSEFORGE_API = "https://api.curseforge.com/v1"
         self.CURSEFORGE_API_KEY = "YOUR_API_KEY_HERE"  # Get from CurseForge
+        self.BULK_CHUNK_SIZE = 500  # File IDs per POST /mods/files request
+        self.EXTRACT_CHUNK_SIZE = 1024 * 1024
         self.cache_dir = os.path.join(launcher.MINECRAFT_DIR, "curseforge_cache")
         os.makedirs(self.cache_dir, exist_ok=True)
+        # (projectID, fileID) records never change, project info does
+        self.files_cache = MetadataCache(os.path.join(self.cache_dir, "files.json"),
+                                         ttl=30 * 24 * 3600, max_entries=50000)
+        self.projects_cache = MetadataCache(os.path.join(self.cache_dir, "projects.json"),
+                                            ttl=24 * 3600, max_entries=10000)
     
     def log(self, message):
         """Unified logging"""
@@ -40,113 +53,224 @@ class CurseForgeHandler:
             self.log(f"❌ Error reading modpack info: {str(e)}")
             return None
     
-    def extract_modpack_files(self, zip_path: str, modpack_name: str) -> bool:
-        """Extract modpack files from zip"""
+    def extract_modpack_files(self, zip_path: str, modpack_name: str,
+                              skip_unchanged: bool = True, max_workers: int = 4) -> bool:
+        """Extract modpack overrides from zip.
+        
+        Members are streamed in fixed-size chunks on a small thread pool;
+        with skip_unchanged, files whose size and CRC32 already match are left alone.
+        """
         try:
             modpack_dir = os.path.join(self.launcher.MODPACKS_DIR, modpack_name)
             os.makedirs(modpack_dir, exist_ok=True)
+            modpack_root = os.path.realpath(modpack_dir)
             
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                members = []
                 # Extract overrides (configs, resourcepacks, etc.)
-                for item in zip_ref.namelist():
-                    if item.startswith('overrides/'):
-                        # Extract file maintaining directory structure
-                        extracted_path = os.path.join(modpack_dir, item[10:])  # Remove 'overrides/' prefix
-                        
-                        if item.endswith('/'):
-                            os.makedirs(extracted_path, exist_ok=True)
-                        else:
-                            os.makedirs(os.path.dirname(extracted_path), exist_ok=True)
-                            with zip_ref.open(item) as source, open(extracted_path, 'wb') as target:
-                                target.write(source.read())
-            
-            self.log(f"✅ Modpack files extracted to {modpack_dir}")
-            return True
+                for info in zip_ref.infolist():
+                    if not info.filename.startswith('overrides/') or info.filename == 'overrides/':
+                        continue
+                    
+                    # Extract file maintaining directory structure
+                    extracted_path = os.path.join(modpack_dir, info.filename[10:])  # Remove 'overrides/' prefix
+                    if not os.path.realpath(extracted_path).startswith(modpack_root + os.sep):
+                        self.log(f"⚠️  Skipping unsafe path in archive: {info.filename}")
+                        continue
+                    
+                    if info.is_dir():
+                        os.makedirs(extracted_path, exist_ok=True)
+                    else:
+                        members.append((info, extracted_path))
+            
+            skipped = []
+            opened = []
+            local = threading.local()
+            
+            def extract_member(member):
+                info, extracted_path = member
+                if skip_unchanged and self._is_unchanged(extracted_path, info):
+                    skipped.append(info.filename)
+                    return True
+                
+                # ZipFile handles are not shared between threads
+                if not hasattr(local, 'zip_ref'):
+                    local.zip_ref = zipfile.ZipFile(zip_path, 'r')
+                    opened.append(local.zip_ref)
+                
+                os.makedirs(os.path.dirname(extracted_path), exist_ok=True)
+                tmp_path = extracted_path + '.extracting'
+                with local.zip_ref.open(info) as source, open(tmp_path, 'wb') as target:
+                    shutil.copyfileobj(source, target, self.EXTRACT_CHUNK_SIZE)
+                os.replace(tmp_path, extracted_path)
+                return True
+            
+            try:
+                results = self.launcher.download_manager.run_parallel(
+                    members, extract_member, max_workers=max_workers)
+            finally:
+                for zip_ref in opened:
+                    zip_ref.close()
+            
+            for (info, _), error in results['failed']:
+                self.log(f"⚠️  Failed to extract {info.filename}: {error}")
+            
+            extracted = len(results['succeeded']) - len(skipped)
+            removed = self._sync_override_list(modpack_dir, [path for _, path in members])
+            self.log(f"✅ Modpack files extracted to {modpack_dir} "
+                     f"({extracted} written, {len(skipped)} unchanged, {removed} removed)")
+            return not results['failed']
             
         except Exception as e:
             self.log(f"❌ Error extracting modpack: {str(e)}")
             return False
     
-    def download_mods_from_manifest(self, manifest: Dict, modpack_name: str) -> bool:
-        """Download mods referenced in manifest.json"""
+    def _sync_override_list(self, modpack_dir: str, extracted_paths: List[str]) -> int:
+        """Delete override files the previous import extracted but this one no longer has.
+        
+        Only paths recorded in OVERRIDES_FILENAME are touched, so files the user
+        added to the modpack folder stay. Returns the number of deleted files.
+        """
+        list_path = os.path.join(modpack_dir, self.OVERRIDES_FILENAME)
+        current = sorted(os.path.relpath(path, modpack_dir).replace(os.sep, '/')
+                         for path in extracted_paths)
+        previous = self._load_json(list_path) or []
+        modpack_root = os.path.realpath(modpack_dir)
+        
+        removed = 0
+        for relative in set(previous) - set(current):
+            path = os.path.join(modpack_dir, *relative.split('/'))
+            if not os.path.realpath(path).startswith(modpack_root + os.sep) or not os.path.isfile(path):
+                continue
+            os.remove(path)
+            removed += 1
+            # Drop directories the removed file leaves empty
+            parent = os.path.dirname(path)
+            while os.path.realpath(parent) != modpack_root and not os.listdir(parent):
+                os.rmdir(parent)
+                parent = os.path.dirname(parent)
+        
+        with open(list_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2, ensure_ascii=False)
+        os.replace(list_path + '.tmp', list_path)
+        return removed
+    
+    def _is_unchanged(self, path: str, info: zipfile.ZipInfo) -> bool:
+        """True if the file on disk has the same size and CRC32 as the zip member"""
+        try:
+            if os.path.getsize(path) != info.file_size:
+                return False
+            crc = 0
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.EXTRACT_CHUNK_SIZE), b''):
+                    crc = zlib.crc32(chunk, crc)
+            return crc == info.CRC
+        except OSError:
+            return False
+    
+    def download_mods_from_manifest(self, manifest: Dict, modpack_name: str, max_workers: int = None) -> Dict:
+        """Download mods referenced in manifest.json using a bounded worker pool"""
+        report = {'total': 0, 'downloaded': 0, 'failed': [], 'success': False}
         try:
             mods_dir = os.path.join(self.launcher.MODPACKS_DIR, modpack_name, "mods")
             os.makedirs(mods_dir, exist_ok=True)
             
             files = manifest.get('files', [])
             total_files = len(files)
+            report['total'] = total_files
             
-            self.log(f"📦 Starting download of {total_files} mods...")
+            tasks = [(f.get('projectID'), f.get('fileID')) for f in files
+                     if f.get('projectID') and f.get('fileID')]
             
-            downloaded = 0
-            failed = []
+            self.log(f"📦 Starting download of {total_files} mods...")
             
-            for idx, file_info in enumerate(files, 1):
-                file_id = file_info.get('fileID')
-                project_id = file_info.get('projectID')
-                required = file_info.get('required', True)
-                
-                if not file_id or not project_id:
-                    continue
-                
-                self.log(f"⏳ Downloading mod {idx}/{total_files}...")
-                
-                if self._download_curse_mod(project_id, file_id, mods_dir):
-                    downloaded += 1
-                else:
-                    failed.append(f"Project:{project_id} File:{file_id}")
+            resolved = self.resolve_manifest_files(manifest)
+            download_manager = self.launcher.download_manager
+            download_manager.reset_stats()
+            
+            # Progress goes to the status bar via telemetry, details to downloads.log
+            batch = download_manager.telemetry.begin(
+                "Загрузка модов", files=len(tasks),
+                total_bytes=sum((resolved.get(file_id) or {}).get('size') or 0
+                                for _, file_id in tasks))
+            try:
+                results = download_manager.run_parallel(
+                    tasks,
+                    lambda task: self._download_curse_mod(task[0], task[1], mods_dir,
+                                                          resolved.get(task[1]), batch),
+                    max_workers=max_workers
+                )
+            finally:
+                download_manager.telemetry.end(batch)
+                # Lookups made by the workers are written once
+                self.files_cache.save()
+            
+            downloaded = len(results['succeeded'])
+            failed = [f"Project:{project_id} File:{file_id}"
+                      for (project_id, file_id), _ in results['failed']]
             
             self.log(f"✅ Downloaded {downloaded}/{total_files} mods")
+            self.log(f"📊 {download_manager.format_stats()}")
             
             if failed:
                 self.log(f"⚠️  Failed to download: {', '.join(failed[:5])}")
             
-            return len(failed) < total_files // 2  # Success if majority downloaded
+            report['downloaded'] = downloaded
+            report['failed'] = failed
+            # Success if most downloaded; incremental updates are often just 1-2 files
+            report['success'] = not failed or len(failed) * 2 < total_files
+            return report
             
         except Exception as e:
             self.log(f"❌ Error downloading mods: {str(e)}")
-            return False
+            return report
     
-    def _download_curse_mod(self, project_id: int, file_id: int, dest_dir: str) -> bool:
+    def _download_curse_mod(self, project_id: int, file_id: int, dest_dir: str,
+                            file_info: Optional[Dict] = None, batch=None) -> bool:
         """Download a single mod from CurseForge using direct URL"""
         try:
-            # Try direct URL format (works for most mods)
-            url = f"https://mediafire.com/api/1.5/file/get/file_id={file_id}"
-            
-            # Alternative: Use the CurseForge API if you have a key
-            url = f"{self.CURSEFORGE_API}/mods/{project_id}/files/{file_id}/download-url"
-            
-            # However, simpler approach: construct the standard CurseForge CDN URL
-            # Format: https://media.forgecdn.net/files/{folder1}/{folder2}/{filename}
+            if file_info is None:
+                file_info = self._get_curseforge_file_info(project_id, file_id, save=False)
             
-            # Use file info endpoint
-            file_url = self._get_curseforge_file_url(project_id, file_id)
+            file_url = file_info.get('download_url') if file_info else None
             
             if not file_url:
                 return False
             
-            response = requests.get(file_url, stream=True, timeout=30)
-            response.raise_for_status()
+            store = self.launcher.mod_store
+            sha1 = file_info.get('hashes', {}).get('sha1')
+            
+            # Known filename lets us skip the request entirely
+            filename = file_info.get('filename')
+            if filename:
+                if not filename.endswith('.jar'):
+                    filename += '.jar'
+                file_path = os.path.join(dest_dir, filename)
+                # Already present with the right hash, or another modpack has this exact jar.
+                # Updated mods often keep the filename, so an existing path alone proves nothing
+                if store.is_placed(sha1, file_path) or store.link_existing(sha1, file_path):
+                    if batch:
+                        batch.file_skipped(file_info.get('size') or 0)
+                    return True
+            
+            # Stable temp name so an interrupted download resumes next time
+            tmp_path = store.temp_path_for(f"curseforge-{file_id}.jar")
+            result = self.launcher.download_manager.download_file(
+                file_url, tmp_path, expected_size=file_info.get('size'),
+                expected_hashes=file_info.get('hashes'), batch=batch)
             
             # Get filename from response headers or URL
-            if 'Content-Disposition' in response.headers:
-                filename = response.headers['Content-Disposition'].split('filename=')[-1].strip('"')
-            else:
-                filename = file_url.split('/')[-1]
-            
-            if not filename.endswith('.jar'):
-                filename += '.jar'
+            if not filename:
+                if 'Content-Disposition' in result['headers']:
+                    filename = result['headers']['Content-Disposition'].split('filename=')[-1].strip('"')
+                else:
+                    filename = file_url.split('/')[-1]
+                
+                if not filename.endswith('.jar'):
+                    filename += '.jar'
             
             file_path = os.path.join(dest_dir, filename)
-            
-            # Check if already downloaded
-            if os.path.exists(file_path):
-                return True
-            
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            store.store_and_link(tmp_path, file_path, move=True, sha1=result['hashes']['sha1'])
             
             return True
             
@@ -154,20 +278,138 @@ class CurseForgeHandler:
             self.log(f"⚠️  Failed to download mod {project_id}: {str(e)}")
             return False
     
-    def _get_curseforge_file_url(self, project_id: int, file_id: int) -> Optional[str]:
-        """Get direct download URL for CurseForge file"""
+    def resolve_manifest_files(self, manifest: Dict) -> Dict[int, Dict]:
+        """Resolve download URL, filename, size and hashes for every manifest file.
+        
+        Uses the bulk POST /mods/files endpoint in chunks and falls back to
+        per-file lookups for IDs the bulk response did not include.
+        Returns a dict keyed by fileID.
+        """
+        projects = {}
+        for file_info in manifest.get('files', []):
+            file_id = file_info.get('fileID')
+            project_id = file_info.get('projectID')
+            if file_id and project_id:
+                projects[file_id] = project_id
+        
+        resolved = {}
+        file_ids = list(projects)
+        
+        for file_id in file_ids:
+            cached = self.files_cache.get(f"{projects[file_id]}:{file_id}")
+            if cached:
+                resolved[file_id] = cached
+        
+        uncached = [file_id for file_id in file_ids if file_id not in resolved]
+        if resolved:
+            self.log(f"💾 {len(resolved)} files resolved from cache")
+        
+        if uncached and self.CURSEFORGE_API_KEY:
+            headers = {'X-Api-Key': self.CURSEFORGE_API_KEY}
+            for start in range(0, len(uncached), self.BULK_CHUNK_SIZE):
+                chunk = uncached[start:start + self.BULK_CHUNK_SIZE]
+                try:
+                    response = self.session.post(f"{self.CURSEFORGE_API}/mods/files",
+                                             json={'fileIds': chunk},
+                                             headers=headers, timeout=30)
+                    if response.status_code != 200:
+                        self.log(f"⚠️  Bulk file lookup failed ({response.status_code})")
+                        continue
+                    
+                    for record in response.json().get('data', []):
+                        info = self._parse_file_record(record)
+                        if info['file_id'] in projects and info['download_url']:
+                            resolved[info['file_id']] = info
+                            self.files_cache.set(f"{projects[info['file_id']]}:{info['file_id']}", info)
+                except Exception as e:
+                    self.log(f"⚠️  Bulk file lookup error: {str(e)}")
+        
+        missing = [file_id for file_id in file_ids if file_id not in resolved]
+        if missing:
+            self.log(f"🔎 Resolving {len(missing)} files individually...")
+        for file_id in missing:
+            info = self._get_curseforge_file_info(projects[file_id], file_id, save=False)
+            if info:
+                resolved[file_id] = info
+        
+        self.files_cache.save()
+        self.log(f"✅ Resolved {len(resolved)}/{len(file_ids)} files")
+        return resolved
+    
+    def resolve_projects(self, project_ids: List[int]) -> Dict[int, Dict]:
+        """Resolve project name/slug for the given IDs (cache first, then bulk POST /mods)"""
+        resolved = {}
+        for project_id in project_ids:
+            cached = self.projects_cache.get(str(project_id))
+            if cached:
+                resolved[project_id] = cached
+        
+        uncached = [project_id for project_id in project_ids if project_id not in resolved]
+        if uncached and self.CURSEFORGE_API_KEY:
+            headers = {'X-Api-Key': self.CURSEFORGE_API_KEY}
+            for start in range(0, len(uncached), self.BULK_CHUNK_SIZE):
+                chunk = uncached[start:start + self.BULK_CHUNK_SIZE]
+                try:
+                    response = self.session.post(f"{self.CURSEFORGE_API}/mods",
+                                             json={'modIds': chunk},
+                                             headers=headers, timeout=30)
+                    if response.status_code != 200:
+                        self.log(f"⚠️  Bulk project lookup failed ({response.status_code})")
+                        continue
+                    
+                    for record in response.json().get('data', []):
+                        info = {'id': record.get('id'), 'name': record.get('name'),
+                                'slug': record.get('slug')}
+                        resolved[info['id']] = info
+                        self.projects_cache.set(str(info['id']), info)
+                except Exception as e:
+                    self.log(f"⚠️  Bulk project lookup error: {str(e)}")
+        
+        self.projects_cache.save()
+        return resolved
+    
+    def _parse_file_record(self, record: Dict) -> Dict:
+        """Convert a CurseForge File object to the launcher's file info dict"""
+        hashes = {}
+        for entry in record.get('hashes', []):
+            algo = {1: 'sha1', 2: 'md5'}.get(entry.get('algo'))
+            if algo and entry.get('value'):
+                hashes[algo] = entry['value'].lower()
+        
+        return {
+            'project_id': record.get('modId'),
+            'file_id': record.get('id'),
+            'download_url': record.get('downloadUrl'),
+            'filename': record.get('fileName'),
+            'size': record.get('fileLength'),
+            'hashes': hashes
+        }
+    
+    def _get_curseforge_file_info(self, project_id: int, file_id: int,
+                                  save: bool = True) -> Optional[Dict]:
+        """Get metadata for a single CurseForge file.
+        
+        save=False leaves writing files_cache to the caller (batch lookups save once).
+        """
         try:
+            cached = self.files_cache.get(f"{project_id}:{file_id}")
+            if cached:
+                return cached
+            
             # Method 1: Try CurseForge API if key is available
             if self.CURSEFORGE_API_KEY:
                 headers = {'X-Api-Key': self.CURSEFORGE_API_KEY}
                 url = f"{self.CURSEFORGE_API}/mods/{project_id}/files/{file_id}"
-                response = requests.get(url, headers=headers, timeout=10)
+                response = self.session.get(url, headers=headers, timeout=10)
                 
                 if response.status_code == 200:
-                    data = response.json()
-                    download_url = data.get('data', {}).get('downloadUrl')
-                    if download_url:
-                        return download_url
+                    data = response.json().get('data', {})
+                    if data.get('downloadUrl'):
+                        info = self._parse_file_record(data)
+                        self.files_cache.set(f"{project_id}:{file_id}", info)
+                        if save:
+                            self.files_cache.save()
+                        return info
             
             # Method 2: Use ForgeAPI (deprecated but still works)
             # Format: https://mediafire.com/api/1.5/file/{id}
@@ -190,6 +432,11 @@ class CurseForgeHandler:
             self.log(f"Error getting file URL: {str(e)}")
             return None
     
+    def _get_curseforge_file_url(self, project_id: int, file_id: int) -> Optional[str]:
+        """Get direct download URL for CurseForge file"""
+        info = self._get_curseforge_file_info(project_id, file_id)
+        return info.get('download_url') if info else None
+    
     def create_modpack_info_from_manifest(self, manifest: Dict, modpack_name: str) -> bool:
         """Create modpack_info.json from manifest.json"""
         try:
@@ -227,6 +474,24 @@ class CurseForgeHandler:
                     modloader_version = loader_id.replace('neoforge-', '')
                     break
             
+            # Resolve file and project metadata (cache first) so the
+            # download thread starts with everything already known
+            files = manifest.get('files', [])
+            resolved = self.resolve_manifest_files(manifest)
+            projects = self.resolve_projects(sorted({f.get('projectID') for f in files
+                                                     if f.get('projectID')}))
+            mods = []
+            for file_info in files:
+                record = resolved.get(file_info.get('fileID'), {})
+                project = projects.get(file_info.get('projectID'), {})
+                mods.append({
+                    'projectID': file_info.get('projectID'),
+                    'fileID': file_info.get('fileID'),
+                    'name': project.get('name'),
+                    'filename': record.get('filename'),
+                    'size': record.get('size')
+                })
+            
             # Count downloaded mods
             mods_dir = os.path.join(modpack_dir, 'mods')
             mod_count = 0
@@ -243,11 +508,18 @@ class CurseForgeHandler:
                 'modloader': modloader,
                 'modloader_version': modloader_version,
                 'source': 'CurseForge',
-                'total_mods': len(manifest.get('files', [])),
-                'downloaded_mods': mod_count
+                'total_mods': len(files),
+                'downloaded_mods': mod_count,
+                'total_size': sum(mod['size'] or 0 for mod in mods),
+                'mods': mods
             }
             
             info_path = os.path.join(modpack_dir, 'modpack_info.json')
+            # On re-import keep launcher-side settings stored in the old info
+            existing = self._load_json(info_path) or {}
+            existing.update(info)
+            info = existing
+            
             with open(info_path, 'w', encoding='utf-8') as f:
                 json.dump(info, f, indent=2, ensure_ascii=False)
             
@@ -259,7 +531,11 @@ class CurseForgeHandler:
             return False
     
     def import_curseforge_zip(self, zip_path: str, modpack_name: str = None) -> bool:
-        """Full process: import CurseForge modpack from zip file"""
+        """Full process: import CurseForge modpack from zip file.
+        
+        If the modpack was imported before, only the difference against the
+        previously imported manifest is applied (see update_modpack_files).
+        """
         try:
             if not os.path.exists(zip_path):
                 self.log(f"❌ File not found: {zip_path}")
@@ -274,17 +550,27 @@ class CurseForgeHandler:
             if not modpack_name:
                 modpack_name = "curseforge_modpack"
             
-            self.log(f"📦 Importing CurseForge modpack: {modpack_name}")
+            modpack_dir = os.path.join(self.launcher.MODPACKS_DIR, modpack_name)
+            previous = self._load_json(os.path.join(modpack_dir, self.MANIFEST_FILENAME))
+            if previous:
+                self.log(f"🔄 Updating CurseForge modpack: {modpack_name}")
+            else:
+                self.log(f"📦 Importing CurseForge modpack: {modpack_name}")
             
             # Read manifest
             manifest = self.get_modpack_info_from_zip(zip_path)
             if not manifest:
                 return False
             
-            # Extract overrides (configs, resourcepacks, etc.)
+            # Extract overrides (configs, resourcepacks, etc.); unchanged files are skipped
             if not self.extract_modpack_files(zip_path, modpack_name):
                 return False
             
+            # Read the old mod list before modpack_info.json is rewritten
+            to_download = None
+            if previous:
+                to_download = self.update_modpack_files(previous, manifest, modpack_name)
+            
             # Create initial modpack_info.json
             if not self.create_modpack_info_from_manifest(manifest, modpack_name):
                 return False
@@ -292,7 +578,7 @@ class CurseForgeHandler:
             # Download mods in background thread
             threading.Thread(
                 target=self._download_mods_thread,
-                args=(manifest, modpack_name),
+                args=(manifest, modpack_name, to_download),
                 daemon=True
             ).start()
             
@@ -302,10 +588,82 @@ class CurseForgeHandler:
             self.log(f"❌ Error importing modpack: {str(e)}")
             return False
     
-    def _download_mods_thread(self, manifest: Dict, modpack_name: str):
-        """Background thread for downloading mods"""
+    def diff_manifests(self, old_manifest: Dict, new_manifest: Dict) -> Dict[str, List[Dict]]:
+        """Compare manifest file lists by (projectID, fileID).
+        
+        A mod whose fileID changed shows up as removed + added.
+        """
+        def entries(manifest):
+            return {(f.get('projectID'), f.get('fileID')): f
+                    for f in manifest.get('files', [])
+                    if f.get('projectID') and f.get('fileID')}
+        
+        old_files = entries(old_manifest)
+        new_files = entries(new_manifest)
+        return {
+            'added': [f for key, f in new_files.items() if key not in old_files],
+            'removed': [f for key, f in old_files.items() if key not in new_files],
+            'kept': [f for key, f in new_files.items() if key in old_files]
+        }
+    
+    def update_modpack_files(self, old_manifest: Dict, new_manifest: Dict, modpack_name: str) -> List[Dict]:
+        """Remove jars dropped from the manifest and return the files that still need downloading.
+        
+        Kept files are only re-downloaded if their jar is missing on disk.
+        """
+        modpack_dir = os.path.join(self.launcher.MODPACKS_DIR, modpack_name)
+        mods_dir = os.path.join(modpack_dir, 'mods')
+        diff = self.diff_manifests(old_manifest, new_manifest)
+        
+        # Filenames of the old version come from modpack_info.json, then from the metadata cache
+        old_info = self._load_json(os.path.join(modpack_dir, 'modpack_info.json')) or {}
+        filenames = {mod.get('fileID'): mod.get('filename')
+                     for mod in old_info.get('mods', []) if mod.get('filename')}
+        
+        def filename_of(file_info):
+            file_id = file_info.get('fileID')
+            if filenames.get(file_id):
+                return filenames[file_id]
+            cached = self.files_cache.get(f"{file_info.get('projectID')}:{file_id}")
+            return cached.get('filename') if cached else None
+        
+        # A jar shared by a removed and an added file is the old version under the
+        # same name: it goes too, and the added file is downloaded in its place
+        kept_filenames = {filename_of(f) for f in diff['kept']}
+        removed = 0
+        for file_info in diff['removed']:
+            filename = filename_of(file_info)
+            if not filename:
+                self.log(f"⚠️  Unknown jar for removed file {file_info.get('fileID')}, left in place")
+                continue
+            path = os.path.join(mods_dir, filename)
+            if filename not in kept_filenames and os.path.exists(path):
+                os.remove(path)
+                removed += 1
+        
+        missing = [f for f in diff['kept']
+                   if not filename_of(f) or not os.path.exists(os.path.join(mods_dir, filename_of(f)))]
+        
+        self.log(f"🔄 Manifest diff: +{len(diff['added'])} -{len(diff['removed'])} "
+                 f"={len(diff['kept'])} ({removed} jars removed, {len(missing)} kept jars missing)")
+        
+        if removed:
+            self.launcher.mod_store.prune()
+        return diff['added'] + missing
+    
+    def _load_json(self, path: str) -> Optional[Dict]:
+        """Read a JSON file, None if it is missing or broken"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _download_mods_thread(self, manifest: Dict, modpack_name: str, files: Optional[List[Dict]] = None):
+        """Background thread for downloading mods (only `files` if given)"""
         try:
-            success = self.download_mods_from_manifest(manifest, modpack_name)
+            to_download = manifest if files is None else dict(manifest, files=files)
+            report = self.download_mods_from_manifest(to_download, modpack_name)
             
             # Update modpack_info.json with final status
             modpack_dir = os.path.join(self.launcher.MODPACKS_DIR, modpack_name)
@@ -319,12 +677,20 @@ class CurseForgeHandler:
                 mod_count = len([f for f in os.listdir(mods_dir) if f.endswith('.jar')]) if os.path.exists(mods_dir) else 0
                 
                 info['downloaded_mods'] = mod_count
-                info['import_complete'] = success
+                info['import_complete'] = report['success'] or report['total'] == 0
+                info['failed_mods'] = report['failed']
                 
                 with open(info_path, 'w', encoding='utf-8') as f:
                     json.dump(info, f, indent=2, ensure_ascii=False)
             
+            # Next import of this modpack is diffed against this manifest;
+            # jars that failed now are picked up then as missing kept files
+            manifest_path = os.path.join(modpack_dir, self.MANIFEST_FILENAME)
+            with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, ensure_ascii=False)
+            os.replace(manifest_path + '.tmp', manifest_path)
+            
             self.launcher.refresh_modpacks_list()
             
         except Exception as e:
-            self.log(f"❌ Error in download thread: {str(e)}")
\ No newline at end of file
+            self.log(f"❌ Error in download thread: {str(e)}")
@@ -0,0 +1,416 @@
+"""Локальные заглушки внешних HTTP-сервисов для офлайн-проверки и бенчмарков.
+
+Запуск: python dev_server.py curseforge --files 300 --latency 0.05
+        python dev_server.py sync --skins 2000 --latency 0.05
+"""
+import argparse
+import asyncio
+import zipfile
+import hashlib
+import io
+import json
+import tarfile
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from PIL import Image
+
+
+def fake_file_bytes(file_id: int, size: int) -> bytes:
+    """Детерминированное содержимое файла по его ID"""
+    seed = hashlib.sha256(str(file_id).encode()).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+def add_common_middleware(app: FastAPI, latency: float = 0.0):
+    """Искусственная задержка и счетчики запросов/байтов в app.state.stats"""
+    app.state.stats = {'requests': 0, 'bytes_sent': 0}
+    app.state.latency = latency
+
+    @app.middleware("http")
+    async def count_and_delay(request: Request, call_next):
+        if app.state.latency:
+            await asyncio.sleep(app.state.latency)
+        response = await call_next(request)
+        if request.url.path.startswith("/_stats"):
+            return response
+
+        app.state.stats['requests'] += 1
+        if 'content-length' in response.headers:
+            app.state.stats['bytes_sent'] += int(response.headers['content-length'])
+        else:
+            # Потоковый ответ: считаем байты по мере отправки
+            body = response.body_iterator
+
+            async def counted():
+                async for chunk in body:
+                    app.state.stats['bytes_sent'] += len(chunk)
+                    yield chunk
+            response.body_iterator = counted()
+        return response
+
+    @app.get("/_stats")
+    def get_stats():
+        return app.state.stats
+
+    @app.post("/_stats/reset")
+    def reset_stats():
+        app.state.stats.update(requests=0, bytes_sent=0)
+        return app.state.stats
+
+
+def create_curseforge_app(file_count: int = 300, file_size: int = 64 * 1024,
+                          latency: float = 0.0, bulk_miss_every: int = 0) -> FastAPI:
+    """Заглушка CurseForge API v1.
+
+    Файлы имеют ID 1000..1000+file_count, проект = ID файла // 10.
+    bulk_miss_every > 0 выкидывает каждый N-й файл из ответа POST /v1/mods/files,
+    чтобы проверить откат на поштучные запросы.
+    """
+    app = FastAPI()
+    add_common_middleware(app, latency)
+    files = {}
+
+    def file_record(request: Request, file_id: int):
+        if file_id not in files:
+            content = fake_file_bytes(file_id, file_size)
+            files[file_id] = {
+                'content': content,
+                'sha1': hashlib.sha1(content).hexdigest(),
+                'md5': hashlib.md5(content).hexdigest()
+            }
+        entry = files[file_id]
+        filename = f"mod-{file_id}.jar"
+        return {
+            'id': file_id,
+            'modId': file_id // 10,
+            'fileName': filename,
+            'fileLength': file_size,
+            'downloadUrl': str(request.base_url) + f"files/{file_id}/{filename}",
+            'hashes': [{'value': entry['sha1'], 'algo': 1},
+                       {'value': entry['md5'], 'algo': 2}]
+        }
+
+    def known(file_id: int) -> bool:
+        return 1000 <= file_id < 1000 + file_count
+
+    @app.post("/v1/mods/files")
+    async def get_files(request: Request):
+        body = await request.json()
+        data = []
+        for file_id in body.get('fileIds', []):
+            if not known(file_id):
+                continue
+            if bulk_miss_every and file_id % bulk_miss_every == 0:
+                continue
+            data.append(file_record(request, file_id))
+        return {'data': data}
+
+    @app.post("/v1/mods")
+    async def get_mods(request: Request):
+        body = await request.json()
+        return {'data': [{'id': project_id, 'name': f"Stand-in Mod {project_id}",
+                          'slug': f"stand-in-mod-{project_id}"}
+                         for project_id in body.get('modIds', [])
+                         if known(project_id * 10) or known(project_id * 10 + 9)]}
+
+    @app.get("/v1/mods/{project_id}/files/{file_id}")
+    def get_file(request: Request, project_id: int, file_id: int):
+        if not known(file_id) or file_id // 10 != project_id:
+            raise HTTPException(status_code=404)
+        return {'data': file_record(request, file_id)}
+
+    @app.get("/files/{file_id}/{filename}")
+    def download_file(request: Request, file_id: int, filename: str):
+        if not known(file_id):
+            raise HTTPException(status_code=404)
+        file_record(request, file_id)
+        return Response(files[file_id]['content'], media_type="application/java-archive")
+
+    return app
+
+
+def stream_tar(files):
+    """Генератор tar-потока из пар (имя, содержимое) без сборки архива в памяти"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w|') as archive:
+        for name, content in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(content))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def fake_skin_png(seed: int, width: int = 64) -> bytes:
+    """Детерминированный PNG-скин width x width (шум проходит проверку скина)"""
+    image = Image.frombytes('RGBA', (width, width), fake_file_bytes(seed, width * width * 4))
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+DEV_ADMIN_KEY = "dev-admin-key"
+
+
+def create_sync_app(skin_count: int = 500, skin_width: int = 64,
+                    latency: float = 0.0, archive: str = "tar",
+                    modpack_count: int = 10, modpack_size: int = 1024 * 1024) -> FastAPI:
+    """Заглушка сервера синхронизации: все эндпоинты, которые использует APIClient.
+
+    Каждое изменение скина увеличивает ревизию; манифест отдается с ETag
+    ревизии и поддерживает If-None-Match и ?since=<ревизия>.
+    app.state.touch_skin(username) / remove_skin(username) меняют данные
+    из кода бенчмарка, то же самое доступно через POST /_dev/skins/....
+    archive: "tar", "zip" или "" (эндпоинт архива скинов отключен).
+    Ключ DEV_ADMIN_KEY разрешает загрузку и удаление скинов любых пользователей.
+    """
+    app = FastAPI()
+    add_common_middleware(app, latency)
+    state = {'revision': 0, 'skins': {}, 'removed': {}, 'users': {}, 'keys': {}, 'modpacks': {}}
+
+    def touch_skin(username: str, content: bytes = None):
+        state['revision'] += 1
+        if content is None:
+            seed = int(hashlib.md5(f"{username}:{state['revision']}".encode()).hexdigest()[:8], 16)
+            content = fake_skin_png(seed, skin_width)
+        state['skins'][username] = {
+            'content': content,
+            'hash': hashlib.md5(content).hexdigest(),
+            'filename': f"{username}.png",
+            'size': len(content),
+            'revision': state['revision']
+        }
+        state['removed'].pop(username, None)
+
+    def remove_skin(username: str):
+        if state['skins'].pop(username, None) is not None:
+            state['revision'] += 1
+            state['removed'][username] = state['revision']
+
+    for index in range(skin_count):
+        touch_skin(f"player{index:05d}")
+
+    for index in range(modpack_count):
+        content = fake_file_bytes(100000 + index, modpack_size)
+        filename = f"pack{index:03d}.zip"
+        state['modpacks'][filename] = {
+            'info': {'id': f"pack{index:03d}", 'name': f"Stand-in Pack {index}",
+                     'filename': filename, 'size': len(content),
+                     'hash': hashlib.md5(content).hexdigest()},
+            'content': content
+        }
+
+    def caller(request: Request):
+        """Имя пользователя по Bearer-ключу, DEV_ADMIN_KEY - администратор"""
+        key = request.headers.get('authorization', '').removeprefix('Bearer ')
+        if key == DEV_ADMIN_KEY:
+            return '*'
+        if key not in state['keys']:
+            raise HTTPException(status_code=401, detail="Invalid API key")
+        return state['keys'][key]
+
+    app.state.touch_skin = touch_skin
+    app.state.remove_skin = remove_skin
+
+    def manifest_entry(skin):
+        return {'hash': skin['hash'], 'filename': skin['filename'], 'size': skin['size']}
+
+    @app.get("/api/skins/manifest")
+    def skins_manifest(request: Request, since: int = None):
+        etag = f'"rev-{state["revision"]}"'
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers={'ETag': etag})
+
+        if since is not None:
+            body = {
+                'revision': state['revision'],
+                'changes': {name: manifest_entry(skin) for name, skin in state['skins'].items()
+                            if skin['revision'] > since},
+                'removed': [name for name, rev in state['removed'].items() if rev > since]
+            }
+        else:
+            body = {'revision': state['revision'],
+                    'skins': {name: manifest_entry(skin) for name, skin in state['skins'].items()}}
+        return Response(json.dumps(body), media_type="application/json", headers={'ETag': etag})
+
+    def skins_archive(usernames):
+        if not archive:
+            raise HTTPException(status_code=404)
+        selected = [(f"{name}.png", state['skins'][name]['content'])
+                    for name in usernames if name in state['skins']]
+        if archive == "zip":
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zip_ref:
+                for name, content in selected:
+                    zip_ref.writestr(name, content)
+            return Response(buffer.getvalue(), media_type="application/zip")
+        return StreamingResponse(stream_tar(selected), media_type="application/x-tar")
+
+    @app.get("/api/skins/archive")
+    def all_skins_archive():
+        return skins_archive(list(state['skins']))
+
+    @app.post("/api/skins/archive")
+    async def selected_skins_archive(request: Request):
+        body = await request.json()
+        return skins_archive(body.get('usernames', []))
+
+    @app.get("/api/skins/{username}")
+    def get_skin(username: str):
+        skin = state['skins'].get(username)
+        if not skin:
+            raise HTTPException(status_code=404)
+        return Response(skin['content'], media_type="image/png")
+
+    @app.delete("/api/skins/{username}")
+    def delete_skin(request: Request, username: str):
+        if caller(request) not in ('*', username):
+            raise HTTPException(status_code=403)
+        if username not in state['skins']:
+            raise HTTPException(status_code=404)
+        remove_skin(username)
+        return {'status': 'deleted'}
+
+    @app.get("/api/skins")
+    def list_skins():
+        return {'skins': sorted(state['skins'])}
+
+    @app.post("/api/skins/upload")
+    async def upload_skin(request: Request, username: str):
+        if caller(request) not in ('*', username):
+            raise HTTPException(status_code=403)
+        form = await request.form()
+        upload = form.get('file')
+        if upload is None:
+            raise HTTPException(status_code=400, detail="file is required")
+        content = await upload.read()
+        if not content.startswith(b'\x89PNG'):
+            raise HTTPException(status_code=400, detail="PNG expected")
+        touch_skin(username, content)
+        return {'status': 'ok', 'hash': state['skins'][username]['hash']}
+
+    @app.get("/uploads/skins/{filename}")
+    def static_skin(filename: str):
+        skin = state['skins'].get(filename.removesuffix('.png'))
+        if not skin:
+            raise HTTPException(status_code=404)
+        return Response(skin['content'], media_type="image/png")
+
+    @app.get("/api/modpacks")
+    def list_modpacks():
+        return {'modpacks': [pack['info'] for pack in state['modpacks'].values()]}
+
+    @app.get("/uploads/modpacks/{filename}")
+    def download_modpack(filename: str):
+        pack = state['modpacks'].get(filename)
+        if not pack:
+            raise HTTPException(status_code=404)
+        return Response(pack['content'], media_type="application/zip")
+
+    @app.post("/api/auth/register")
+    def register(username: str, password: str):
+        if username in state['users']:
+            raise HTTPException(status_code=400, detail="User already exists")
+        api_key = hashlib.sha256(f"{username}:{password}".encode()).hexdigest()
+        state['users'][username] = {'password': password, 'api_key': api_key}
+        state['keys'][api_key] = username
+        return {'api_key': api_key}
+
+    @app.post("/api/auth/login")
+    def login(username: str, password: str):
+        user = state['users'].get(username)
+        if not user or user['password'] != password:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        return {'api_key': user['api_key']}
+
+    @app.get("/api/health")
+    def health():
+        return {'status': 'ok'}
+
+    @app.get("/api/stats")
+    def server_stats():
+        return {'stats': {'skins': len(state['skins']), 'modpacks': len(state['modpacks']),
+                          'users': len(state['users']), 'revision': state['revision']}}
+
+    @app.post("/_dev/skins/{username}/touch")
+    def dev_touch(username: str):
+        touch_skin(username)
+        return {'revision': state['revision']}
+
+    @app.post("/_dev/skins/{username}/remove")
+    def dev_remove(username: str):
+        remove_skin(username)
+        return {'revision': state['revision']}
+
+    return app
+
+
+def make_manifest(file_count: int = 300) -> dict:
+    """manifest.json, совпадающий с данными заглушки CurseForge"""
+    return {
+        'name': 'Stand-in Pack',
+        'version': '1.0.0',
+        'minecraft': {'version': '1.20.1', 'modLoaders': [{'id': 'forge-47.2.0', 'primary': True}]},
+        'files': [{'projectID': file_id // 10, 'fileID': file_id, 'required': True}
+                  for file_id in range(1000, 1000 + file_count)]
+    }
+
+
+def serve_in_background(app: FastAPI, host: str = "127.0.0.1", port: int = 0):
+    """Запускает приложение в фоновом потоке, возвращает (server, base_url)"""
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    while not server.started:
+        time.sleep(0.05)
+
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальные заглушки серверов лаунчера")
+    sub = parser.add_subparsers(dest="service", required=True)
+
+    cf = sub.add_parser("curseforge", help="заглушка CurseForge API")
+    cf.add_argument("--files", type=int, default=300)
+    cf.add_argument("--file-size", type=int, default=64 * 1024)
+    cf.add_argument("--bulk-miss-every", type=int, default=0)
+
+    sync = sub.add_parser("sync", help="заглушка сервера синхронизации")
+    sync.add_argument("--skins", type=int, default=500)
+    sync.add_argument("--skin-width", type=int, default=64)
+    sync.add_argument("--modpacks", type=int, default=10)
+    sync.add_argument("--modpack-size", type=int, default=1024 * 1024)
+    sync.add_argument("--archive", choices=["tar", "zip", ""], default="tar",
+                      help="формат архива скинов, пустая строка - без архива")
+
+    for p in sub.choices.values():
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8765)
+        p.add_argument("--latency", type=float, default=0.0, help="задержка на запрос, сек")
+
+    args = parser.parse_args()
+
+    if args.service == "curseforge":
+        app = create_curseforge_app(args.files, args.file_size, args.latency, args.bulk_miss_every)
+        print(f"CURSEFORGE_API = http://{args.host}:{args.port}/v1")
+    elif args.service == "sync":
+        app = create_sync_app(args.skins, args.skin_width, args.latency, args.archive,
+                              args.modpacks, args.modpack_size)
+        print(f"base_url = http://{args.host}:{args.port}")
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
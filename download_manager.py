@@ -0,0 +1,487 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import requests
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from utils import get_download_session
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Optional
+
+
+class DownloadError(Exception):
+    """Файл не удалось скачать после всех попыток"""
+
+
+def get_download_logger(log_dir: str) -> logging.Logger:
+    """Файловый лог подробностей по каждой загрузке (не засоряет окно лаунчера)"""
+    logger = logging.getLogger("launcher.downloads")
+    log_path = os.path.abspath(os.path.join(log_dir, "downloads.log"))
+    if not any(getattr(h, 'baseFilename', None) == log_path for h in logger.handlers):
+        os.makedirs(log_dir, exist_ok=True)
+        handler = RotatingFileHandler(log_path, maxBytes=1024 * 1024, backupCount=3, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class DownloadBatch:
+    """Счетчики одного пакета загрузок (моды, скины, установка версии...).
+
+    Возвращается DownloadTelemetry.begin; рабочие потоки пакета обновляют
+    только его, поэтому параллельные пакеты не смешивают итоги.
+    """
+    RATE_WINDOW = 3.0
+
+    def __init__(self, label: str, files: int = 0, total_bytes: int = 0):
+        self._lock = threading.Lock()
+        self.label = label
+        self.files_total = files
+        self.files_done = 0
+        self.files_failed = 0
+        self.bytes_total = total_bytes
+        self.bytes_done = 0
+        self.in_flight = 0
+        self.started = time.monotonic()
+        self._samples = deque([(self.started, 0)])
+
+    def set_label(self, label: str):
+        self.label = label
+
+    def set_files_total(self, files: int):
+        self.files_total = files
+
+    def set_files_done(self, files: int):
+        self.files_done = files
+
+    def file_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def add_bytes(self, count: int):
+        with self._lock:
+            self.bytes_done += count
+
+    def file_finished(self, ok: bool):
+        with self._lock:
+            self.in_flight -= 1
+            if ok:
+                self.files_done += 1
+            else:
+                self.files_failed += 1
+
+    def file_skipped(self, size: int = 0):
+        """Файл пакета уже есть на диске: засчитывается без загрузки"""
+        with self._lock:
+            self.files_done += 1
+            self.bytes_total = max(0, self.bytes_total - size)
+
+    def mclib_callback(self) -> Dict:
+        """Callback для minecraft_launcher_lib: статус и прогресс идут через сводку"""
+        return {
+            'setStatus': self.set_label,
+            'setProgress': self.set_files_done,
+            'setMax': self.set_files_total
+        }
+
+    def format_status(self) -> str:
+        """Строка состояния по текущим счетчикам"""
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, self.bytes_done))
+            while len(self._samples) > 2 and now - self._samples[0][0] > self.RATE_WINDOW:
+                self._samples.popleft()
+            first_time, first_bytes = self._samples[0]
+            rate = (self.bytes_done - first_bytes) / (now - first_time) if now > first_time else 0.0
+
+            parts = []
+            if self.files_total:
+                parts.append(f"{self.files_done}/{self.files_total} файлов")
+            if self.bytes_done or self.bytes_total:
+                done_mb = self.bytes_done / 1024 / 1024
+                parts.append(f"{done_mb:.1f}/{self.bytes_total / 1024 / 1024:.1f} MB"
+                             if self.bytes_total else f"{done_mb:.1f} MB")
+            if rate > 0:
+                parts.append(f"{rate / 1024 / 1024:.1f} MB/s")
+                if self.bytes_total > self.bytes_done:
+                    eta = int((self.bytes_total - self.bytes_done) / rate)
+                    parts.append(f"осталось ~{eta // 60}:{eta % 60:02d}")
+            if self.in_flight:
+                parts.append(f"активно {self.in_flight}")
+            label = self.label
+
+        return f"{label}: {', '.join(parts)}" if parts else label
+
+    def format_summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        with self._lock:
+            summary = f"{self.label}: готово {self.files_done} файлов"
+            if self.bytes_done:
+                summary += f", {self.bytes_done / 1024 / 1024:.1f} MB"
+            summary += f" за {elapsed:.1f} с"
+            if self.files_failed:
+                summary += f", ошибок {self.files_failed}"
+        return summary
+
+
+class DownloadTelemetry:
+    """Сводка по всем текущим загрузкам для строки состояния.
+
+    Каждый пакет получает свой DownloadBatch из begin(); рабочие потоки
+    обновляют только его счетчики, а в интерфейс сводка по всем активным
+    пакетам уходит отдельным потоком раз в PUBLISH_INTERVAL секунд.
+    """
+    PUBLISH_INTERVAL = 0.25
+
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self._lock = threading.Lock()
+        self._batches = []
+        self._stop = threading.Event()
+        self._ticker = None
+        self._generation = 0
+
+    @property
+    def active(self):
+        with self._lock:
+            return bool(self._batches)
+
+    def begin(self, label: str, files: int = 0, total_bytes: int = 0) -> DownloadBatch:
+        """Начинает пакет загрузок и возвращает его счетчики"""
+        batch = DownloadBatch(label, files, total_bytes)
+        with self._lock:
+            self._batches.append(batch)
+            if len(self._batches) == 1:
+                self._stop.clear()
+                self._ticker = threading.Thread(target=self._run, args=(self._generation,),
+                                                daemon=True)
+                self._ticker.start()
+        return batch
+
+    def end(self, batch: DownloadBatch, summary: bool = True):
+        """Завершает пакет и публикует его итог (summary=False - итог пишет вызывающий)"""
+        with self._lock:
+            if batch in self._batches:
+                self._batches.remove(batch)
+            if not self._batches:
+                self._stop.set()
+                # Запоздавшие публикации тикера после этого отбрасываются
+                self._generation += 1
+        if summary:
+            self._publish(batch.format_summary())
+
+    def format_status(self) -> str:
+        """Строка состояния по всем активным пакетам"""
+        with self._lock:
+            batches = list(self._batches)
+        return " | ".join(batch.format_status() for batch in batches)
+
+    def _run(self, generation):
+        while not self._stop.wait(self.PUBLISH_INTERVAL) and generation == self._generation:
+            self._publish(self.format_status(), generation)
+
+    def _publish(self, text, generation=None):
+        """Передает строку в MainTab.set_status из потока Tk"""
+        root = getattr(self.launcher, 'root', None)
+        main_tab = getattr(self.launcher, 'main_tab', None)
+        if root is None or main_tab is None or not text:
+            return
+        generation = self._generation if generation is None else generation
+        try:
+            root.after(0, self._apply, main_tab, text, generation)
+        except Exception:
+            pass
+
+    def _apply(self, main_tab, text, generation):
+        if generation == self._generation:
+            main_tab.set_status(text)
+
+
+class DownloadManager:
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_RETRIES = 3
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, launcher, max_workers: int = None):
+        self.launcher = launcher
+        self.session = get_download_session()
+        self.max_workers = max_workers or self.DEFAULT_MAX_WORKERS
+        self.telemetry = DownloadTelemetry(launcher)
+        self.file_log = get_download_logger(
+            os.path.join(launcher.MINECRAFT_DIR, "launcher_cache", "logs"))
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def log(self, message):
+        """Логирование через лаунчер"""
+        if hasattr(self.launcher, 'log'):
+            self.launcher.log(message)
+        else:
+            print(f"[DownloadManager] {message}")
+
+    def reset_stats(self):
+        """Сбрасывает накопленную статистику загрузок"""
+        with self._stats_lock:
+            self.stats = {
+                'files': 0,
+                'bytes': 0,
+                'download_seconds': 0.0,
+                'hash_seconds': 0.0,
+                'hash_mismatches': 0,
+                'retries': 0
+            }
+
+    def _add_stats(self, **values):
+        with self._stats_lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def format_stats(self):
+        """Краткая строка статистики для лога"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        mb = stats['bytes'] / 1024 / 1024
+        return (f"{stats['files']} файлов, {mb:.1f} MB за {stats['download_seconds']:.1f} с, "
+                f"хэширование {stats['hash_seconds']:.2f} с, "
+                f"несовпадений хэша {stats['hash_mismatches']}, повторов {stats['retries']}")
+
+    def run_parallel(self, tasks: Iterable, worker: Callable, max_workers: int = None) -> Dict:
+        """Выполняет worker(task) для каждой задачи в пуле потоков.
+
+        Возвращает словарь с успешными задачами и списком (задача, ошибка)
+        для неудачных. Исключение в одной задаче не прерывает остальные.
+        """
+        tasks = list(tasks)
+        results = {'succeeded': [], 'failed': []}
+        if not tasks:
+            return results
+
+        workers = max(1, min(max_workers or self.max_workers, len(tasks)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(worker, task): task for task in tasks}
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    if future.result():
+                        results['succeeded'].append(task)
+                    else:
+                        results['failed'].append((task, None))
+                except Exception as e:
+                    results['failed'].append((task, str(e)))
+
+        return results
+
+    def download_file(self, url: str, dest_path: str, expected_size: Optional[int] = None,
+                      headers: Optional[Dict] = None, timeout: int = 30,
+                      retries: Optional[int] = None,
+                      expected_hashes: Optional[Dict[str, str]] = None,
+                      batch: Optional[DownloadBatch] = None) -> Dict:
+        """Скачивает url в dest_path с докачкой через dest_path.part.
+
+        Оборванная загрузка продолжается запросом Range/If-Range, итоговый
+        файл появляется атомарно и только после проверки длины и хэшей.
+        expected_hashes ({'sha1': ..., 'md5': ...}) считаются прямо в цикле
+        записи; при несовпадении файл скачивается заново.
+        batch - пакет телеметрии, в который засчитывается файл.
+        Возвращает {'path', 'size', 'headers', 'hashes'}, при неудаче бросает DownloadError.
+        """
+        part_path = dest_path + ".part"
+        meta_path = part_path + ".json"
+        retries = self.DEFAULT_RETRIES if retries is None else retries
+        expected_hashes = {algo.lower(): value.lower()
+                           for algo, value in (expected_hashes or {}).items() if value}
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+        name = os.path.basename(dest_path)
+
+        # Загрузка вне пакета (batch=None) показывается в статусе сама по себе
+        standalone = batch is None
+        if standalone:
+            batch = self.telemetry.begin(f"Загрузка {name}", files=1, total_bytes=expected_size or 0)
+        batch.file_started()
+        ok = False
+        try:
+            result = self._download_with_retries(url, dest_path, part_path, meta_path,
+                                                 expected_size, headers, timeout,
+                                                 retries, expected_hashes, batch)
+            ok = True
+            return result
+        finally:
+            batch.file_finished(ok)
+            if standalone:
+                self.telemetry.end(batch)
+
+    def _download_with_retries(self, url, dest_path, part_path, meta_path, expected_size,
+                               headers, timeout, retries, expected_hashes, batch):
+        name = os.path.basename(dest_path)
+        started = time.perf_counter()
+        last_error = "файл не прошел проверку размера или хэша"
+        for attempt in range(retries + 1):
+            if attempt:
+                self._add_stats(retries=1)
+                time.sleep(min(2 ** (attempt - 1), 10))
+            try:
+                result = self._download_attempt(url, part_path, meta_path,
+                                                expected_size, headers, timeout,
+                                                expected_hashes, batch)
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else 0
+                if 400 <= status < 500 and status not in (408, 429):
+                    self.file_log.error("%s: %s", url, e)
+                    raise DownloadError(f"Не удалось скачать {url}: {e}")
+                last_error = str(e)
+                self.file_log.warning("Ошибка сервера (%d/%d): %s: %s",
+                                      attempt + 1, retries + 1, name, last_error)
+                continue
+            except (requests.exceptions.RequestException, OSError) as e:
+                last_error = str(e)
+                self.file_log.warning("Загрузка прервана (%d/%d): %s: %s",
+                                      attempt + 1, retries + 1, name, last_error)
+                continue
+
+            if result is None:
+                continue
+
+            os.replace(part_path, dest_path)
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            result['path'] = dest_path
+            seconds = time.perf_counter() - started
+            self._add_stats(files=1, bytes=result['size'], download_seconds=seconds)
+            self.file_log.info("%s -> %s: %d байт за %.2f с", url, dest_path, result['size'], seconds)
+            return result
+
+        self.file_log.error("%s: %s", url, last_error)
+        raise DownloadError(f"Не удалось скачать {url}: {last_error}")
+
+    def _download_attempt(self, url, part_path, meta_path, expected_size, headers, timeout,
+                          expected_hashes, batch):
+        """Одна попытка загрузки; None означает, что файл нужно докачать/перекачать"""
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        request_headers = dict(headers or {})
+        if offset:
+            validator = self._load_validator(meta_path)
+            if validator:
+                request_headers['Range'] = f"bytes={offset}-"
+                request_headers['If-Range'] = validator
+            elif expected_size:
+                request_headers['Range'] = f"bytes={offset}-"
+            else:
+                # Без валидатора и известного размера склеивать куски небезопасно
+                self._discard_part(part_path, meta_path)
+                offset = 0
+
+        with self.session.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 416 and offset:
+                # Запрошенный диапазон пуст: либо .part уже полный, либо он мусорный
+                total = self._content_range_total(response.headers.get('Content-Range'))
+                if (expected_size or total) == offset:
+                    return self._verify_complete_part(part_path, meta_path, offset,
+                                                      response.headers, expected_hashes)
+                self._discard_part(part_path, meta_path)
+                return None
+
+            response.raise_for_status()
+
+            if response.status_code == 206:
+                mode = 'ab'
+                total = self._content_range_total(response.headers.get('Content-Range'))
+            else:
+                mode = 'wb'
+                total = None
+                if response.headers.get('Content-Encoding', 'identity') == 'identity':
+                    total = int(response.headers.get('Content-Length', 0)) or None
+
+            self._save_validator(meta_path, response.headers)
+
+            # sha1 нужен всегда: по нему файл кладется в хранилище модов
+            hashers = {algo: hashlib.new(algo) for algo in set(expected_hashes) | {'sha1'}}
+            hash_seconds = 0.0
+            if mode == 'ab':
+                # Хэш уже скачанной части можно получить только перечитав ее
+                hash_seconds += self._hash_existing(part_path, hashers)
+
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        batch.add_bytes(len(chunk))
+                        hash_started = time.perf_counter()
+                        for hasher in hashers.values():
+                            hasher.update(chunk)
+                        hash_seconds += time.perf_counter() - hash_started
+
+            self._add_stats(hash_seconds=hash_seconds)
+            response_headers = response.headers
+
+        size = os.path.getsize(part_path)
+        expected = expected_size or total
+        if expected and size != expected:
+            self.file_log.warning("Размер %s: %d из %d байт", os.path.basename(part_path), size, expected)
+            if size > expected:
+                self._discard_part(part_path, meta_path)
+            return None
+
+        digests = {algo: hasher.hexdigest() for algo, hasher in hashers.items()}
+        for algo, value in expected_hashes.items():
+            if digests.get(algo) != value:
+                self._add_stats(hash_mismatches=1)
+                self.file_log.warning("Хэш %s не совпал: %s", algo, os.path.basename(part_path))
+                self._discard_part(part_path, meta_path)
+                return None
+
+        return {'size': size, 'headers': response_headers, 'hashes': digests}
+
+    def _verify_complete_part(self, part_path, meta_path, size, headers, expected_hashes):
+        """Проверяет .part, который уже был скачан целиком в прошлый раз"""
+        hashers = {algo: hashlib.new(algo) for algo in set(expected_hashes) | {'sha1'}}
+        self._add_stats(hash_seconds=self._hash_existing(part_path, hashers))
+
+        digests = {algo: hasher.hexdigest() for algo, hasher in hashers.items()}
+        if any(digests.get(algo) != value for algo, value in expected_hashes.items()):
+            self._add_stats(hash_mismatches=1)
+            self._discard_part(part_path, meta_path)
+            return None
+        return {'size': size, 'headers': headers, 'hashes': digests}
+
+    def _hash_existing(self, path, hashers):
+        """Докармливает хэши содержимым файла, возвращает затраченное время"""
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+        return time.perf_counter() - started
+
+    def _content_range_total(self, content_range):
+        """Полный размер из заголовка 'bytes a-b/total'"""
+        try:
+            total = content_range.rsplit('/', 1)[1]
+            return int(total) if total != '*' else None
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    def _load_validator(self, meta_path):
+        """ETag/Last-Modified ответа, с которого начата загрузка .part"""
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('validator')
+        except (OSError, ValueError):
+            return None
+
+    def _save_validator(self, meta_path, headers):
+        etag = headers.get('ETag')
+        # Слабый ETag нельзя использовать в If-Range
+        validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+        if validator:
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'validator': validator}, f)
+
+    def _discard_part(self, part_path, meta_path):
+        for path in (part_path, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,202 @@
+import os
+import re
+import sys
+import json
+import ctypes
+import subprocess
+
+# Куча без модов и прибавка на каждый мод (МБ)
+BASE_HEAP_MB = 2048
+HEAP_PER_MOD_MB = 40
+MIN_HEAP_MB = 1024
+MAX_HEAP_MB = 16384
+# Системе и нативной памяти JVM оставляется не меньше этого
+RESERVED_MB = 2048
+MAX_RAM_SHARE = 0.6
+# -Xms как доля -Xmx
+INITIAL_HEAP_SHARE = 0.5
+# С такой кучи на Java 21 выбирается ZGC
+ZGC_MIN_HEAP_MB = 8192
+
+G1_FLAGS = [
+    "-XX:+UseG1GC",
+    "-XX:+ParallelRefProcEnabled",
+    "-XX:MaxGCPauseMillis=200",
+    "-XX:+UnlockExperimentalVMOptions",
+    "-XX:+DisableExplicitGC",
+    "-XX:G1NewSizePercent=30",
+    "-XX:G1MaxNewSizePercent=40",
+    "-XX:G1ReservePercent=20",
+    "-XX:G1HeapWastePercent=5",
+    "-XX:G1MixedGCCountTarget=4",
+    "-XX:InitiatingHeapOccupancyPercent=15",
+    "-XX:G1MixedGCLiveThresholdPercent=90",
+    "-XX:G1RSetUpdatingPauseTimePercent=5",
+    "-XX:SurvivorRatio=32",
+    "-XX:+PerfDisableSharedMem",
+    "-XX:MaxTenuringThreshold=1",
+]
+ZGC_FLAGS = ["-XX:+UseZGC", "-XX:+ZGenerational", "-XX:+DisableExplicitGC"]
+
+
+def physical_memory_mb():
+    """Объем физической памяти в МБ или None, если узнать не удалось"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    if sys.platform == 'win32':
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        try:
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.ullTotalPhys // (1024 * 1024)
+        except (OSError, AttributeError):
+            pass
+
+    if sys.platform == 'darwin':
+        try:
+            output = subprocess.run(['sysctl', '-n', 'hw.memsize'], capture_output=True,
+                                    text=True, timeout=5).stdout
+            return int(output.strip()) // (1024 * 1024)
+        except (OSError, ValueError, subprocess.SubprocessError):
+            pass
+
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def java_major_for(minecraft_version):
+    """Версия Java, с которой запускается данная версия Minecraft"""
+    numbers = [int(part) for part in re.findall(r'\d+', minecraft_version or '')[:3]]
+    version = tuple(numbers + [0] * (3 - len(numbers)))
+    if version >= (1, 20, 5):
+        return 21
+    if version >= (1, 18, 0):
+        return 17
+    if version >= (1, 17, 0):
+        return 16
+    return 8
+
+
+def choose_heap_mb(mod_count, total_mb):
+    """Максимальная куча по числу модов, ограниченная объемом памяти"""
+    wanted = min(BASE_HEAP_MB + mod_count * HEAP_PER_MOD_MB, MAX_HEAP_MB)
+    if total_mb:
+        available = min(total_mb - RESERVED_MB, int(total_mb * MAX_RAM_SHARE))
+        wanted = min(wanted, available)
+    return max(MIN_HEAP_MB, wanted // 256 * 256)
+
+
+def choose_gc(java_major, heap_mb):
+    """'zgc' для больших куч на Java 21 (поколенческий ZGC), иначе 'g1'"""
+    return 'zgc' if java_major >= 21 and heap_mb >= ZGC_MIN_HEAP_MB else 'g1'
+
+
+def gc_flags(gc, heap_mb):
+    if gc == 'zgc':
+        return list(ZGC_FLAGS)
+    # Регионы крупнее на больших кучах, чтобы крупные объекты (чанки) не были humongous
+    region = "16M" if heap_mb > 12288 else "8M"
+    return G1_FLAGS + [f"-XX:G1HeapRegionSize={region}"]
+
+
+class JvmTuner:
+    """Подбор аргументов JVM для запуска.
+
+    Размер кучи зависит от числа модов и физической памяти, сборщик -
+    от версии Java, которую требует версия Minecraft. Ключ "jvm" в
+    modpack_info.json переопределяет выбор:
+    {"max_heap_mb": 8192, "min_heap_mb": 4096, "gc": "g1" | "zgc",
+     "extra_args": ["-Dfoo=bar"], "appcds": true}
+    (appcds включает архив классов, см. app_cds.py)
+    """
+
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self._total_mb = None
+
+    def log(self, message):
+        """Логирование через лаунчер"""
+        self.launcher.log(message)
+
+    @property
+    def total_mb(self):
+        if self._total_mb is None:
+            self._total_mb = physical_memory_mb() or 0
+        return self._total_mb
+
+    def jvm_arguments(self, minecraft_version, modpack=None):
+        """Аргументы JVM для версии и модпака (None - без модпака)"""
+        overrides = {}
+        mods_dir = os.path.join(self.launcher.MINECRAFT_DIR, "mods")
+        if modpack:
+            mods_dir = os.path.join(self.launcher.MODPACKS_DIR, modpack, "mods")
+            overrides = self.modpack_overrides(modpack)
+
+        mod_count = self._count_mods(mods_dir)
+        java_major = java_major_for(minecraft_version)
+
+        heap_mb = self._int_override(overrides, 'max_heap_mb')
+        if heap_mb is None:
+            heap_mb = choose_heap_mb(mod_count, self.total_mb)
+        min_heap_mb = self._int_override(overrides, 'min_heap_mb')
+        if min_heap_mb is None:
+            min_heap_mb = int(heap_mb * INITIAL_HEAP_SHARE) // 256 * 256
+        min_heap_mb = max(256, min(min_heap_mb, heap_mb))
+
+        gc = overrides.get('gc') or choose_gc(java_major, heap_mb)
+        if gc == 'zgc' and java_major < 21:
+            self.log("ZGC из настроек модпака требует Java 21, используется G1")
+            gc = 'g1'
+        elif gc not in ('g1', 'zgc'):
+            self.log(f"Неизвестный сборщик '{gc}' в настройках модпака, используется G1")
+            gc = 'g1'
+
+        args = [f"-Xmx{heap_mb}M", f"-Xms{min_heap_mb}M"] + gc_flags(gc, heap_mb)
+        args += [str(arg) for arg in overrides.get('extra_args', [])]
+
+        memory = f"{self.total_mb} МБ" if self.total_mb else "неизвестно"
+        self.log(f"JVM: куча {min_heap_mb}-{heap_mb} МБ, {gc.upper()}, Java {java_major}, "
+                 f"модов {mod_count}, памяти {memory}")
+        return args
+
+    def modpack_overrides(self, modpack):
+        """Содержимое ключа "jvm" из modpack_info.json ({} если нет)"""
+        if not modpack:
+            return {}
+        info_file = os.path.join(self.launcher.MODPACKS_DIR, modpack, "modpack_info.json")
+        try:
+            with open(info_file, 'r', encoding='utf-8') as f:
+                overrides = json.load(f).get('jvm') or {}
+            return overrides if isinstance(overrides, dict) else {}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _int_override(self, overrides, key):
+        value = overrides.get(key)
+        if value is None:
+            return None
+        try:
+            return max(256, int(value))
+        except (TypeError, ValueError):
+            self.log(f"Некорректное значение jvm.{key} в настройках модпака: {value}")
+            return None
+
+    def _count_mods(self, mods_dir):
+        try:
+            return len([f for f in os.listdir(mods_dir) if f.endswith('.jar')])
+        except OSError:
+            return 0
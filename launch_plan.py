@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import minecraft_launcher_lib as mclib
+from metadata_cache import MetadataCache
+
+# Подставляются вместо данных аккаунта при построении шаблона команды
+USERNAME_PLACEHOLDER = "@@LAUNCHER_USERNAME@@"
+UUID_PLACEHOLDER = "@@LAUNCHER_UUID@@"
+TOKEN_PLACEHOLDER = "@@LAUNCHER_TOKEN@@"
+
+
+class LaunchPlanCache:
+    """Кэш команд запуска Minecraft.
+
+    get_minecraft_command каждый раз читает и сливает цепочку version JSON
+    (inheritsFrom) и перебирает все библиотеки. Готовая команда (classpath,
+    main class, аргументы) хранится как шаблон с метками вместо имени, uuid
+    и токена; запись действительна, пока не изменились mtime/размер JSON из
+    цепочки. Повторный запуск только подставляет данные аккаунта.
+    """
+    TTL = 30 * 24 * 3600
+    MAX_PLANS = 32
+
+    def __init__(self, launcher, cache_dir):
+        self.launcher = launcher
+        self.minecraft_dir = launcher.MINECRAFT_DIR
+        self.plans = MetadataCache(os.path.join(cache_dir, "launch_plans.json"),
+                                   ttl=self.TTL, max_entries=self.MAX_PLANS)
+
+    def log(self, message):
+        """Логирование через лаунчер"""
+        self.launcher.log(message)
+
+    def resolve_launch_version(self, minecraft_version, modloader):
+        """Id установленной версии для запуска (профиль модлоадера или сама версия).
+
+        Результат кэшируется до изменения папки versions (установка/удаление).
+        """
+        versions_dir = os.path.join(self.minecraft_dir, "versions")
+        try:
+            versions_mtime = os.stat(versions_dir).st_mtime_ns
+        except OSError:
+            return minecraft_version
+
+        key = f"version:{modloader}:{minecraft_version}"
+        cached = self.plans.get(key)
+        if cached and cached['versions_mtime'] == versions_mtime:
+            return cached['id']
+
+        launch_version = self._find_launch_version(minecraft_version, modloader)
+        self.plans.set(key, {'versions_mtime': versions_mtime, 'id': launch_version})
+        self.plans.save()
+        return launch_version
+
+    def _find_launch_version(self, minecraft_version, modloader):
+        installed_versions = mclib.utils.get_installed_versions(self.minecraft_dir)
+
+        if modloader == "Forge":
+            for v in installed_versions:
+                if "forge" in v['id'].lower() and minecraft_version in v['id']:
+                    return v['id']
+        elif modloader == "Fabric":
+            for v in installed_versions:
+                if "fabric" in v['id'].lower():
+                    return v['id']
+        elif modloader == "NeoForge":
+            for v in installed_versions:
+                vid = v['id'].lower()
+                if ("neoforge" in vid or "neoformed" in vid) and minecraft_version in v['id']:
+                    return v['id']
+        return minecraft_version
+
+    def get_command(self, launch_version, options):
+        """Команда запуска для launch_version; то же, что mclib.command.get_minecraft_command"""
+        account = {
+            USERNAME_PLACEHOLDER: options.get("username", ""),
+            UUID_PLACEHOLDER: options.get("uuid", ""),
+            TOKEN_PLACEHOLDER: options.get("token", ""),
+        }
+        template_options = dict(options, username=USERNAME_PLACEHOLDER,
+                                uuid=UUID_PLACEHOLDER, token=TOKEN_PLACEHOLDER)
+        key = self._plan_key(launch_version, template_options)
+
+        plan = self.plans.get(key)
+        if plan and self._is_fresh(plan):
+            self.log("Команда запуска взята из кэша")
+        else:
+            command = mclib.command.get_minecraft_command(launch_version, self.minecraft_dir,
+                                                          template_options)
+            plan = {'files': self.version_files(launch_version), 'command': command}
+            self.plans.set(key, plan)
+        self.plans.save()
+
+        return [self._fill(arg, account) for arg in plan['command']]
+
+    def _plan_key(self, launch_version, template_options):
+        payload = json.dumps({'version': launch_version, 'dir': self.minecraft_dir,
+                              'options': template_options}, sort_keys=True, default=str)
+        return "command:" + hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def version_files(self, launch_version):
+        """[путь, mtime_ns, размер] для каждого JSON в цепочке inheritsFrom"""
+        files = []
+        version_id = launch_version
+        while version_id and len(files) < 16:
+            path = os.path.join(self.minecraft_dir, "versions", version_id, f"{version_id}.json")
+            stat = os.stat(path)
+            files.append([path, stat.st_mtime_ns, stat.st_size])
+            with open(path, 'r', encoding='utf-8') as f:
+                version_id = json.load(f).get('inheritsFrom')
+        return files
+
+    def _is_fresh(self, plan):
+        for path, mtime_ns, size in plan['files']:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return False
+            if stat.st_mtime_ns != mtime_ns or stat.st_size != size:
+                return False
+        # Java из runtime лаунчера могла быть удалена
+        java = plan['command'][0]
+        return not os.path.isabs(java) or os.path.exists(java)
+
+    def _fill(self, arg, account):
+        for placeholder, value in account.items():
+            if placeholder in arg:
+                arg = arg.replace(placeholder, value)
+        return arg
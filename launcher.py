@@ -1,21 +1,26 @@
 from tabs import MainTab, ModsTab, ModpacksTab, SyncTab
 from curseforge_handler import CurseForgeHandler
 from version_manager import VersionManager
+from download_manager import DownloadManager
+from mod_store import ModStore
 import minecraft_launcher_lib as mclib
 from skin_manager import SkinManager
+from skin_watcher import SkinWatcher
 from tkinter import ttk, messagebox
-from api_client import APIClient
+from api_client import APIClient, UPLOAD_UNCHANGED
 from PIL import Image, ImageTk
 from datetime import datetime
 import tkinter as tk
 import threading
 import requests
-import hashlib
 import shutil
 import json
 import os
 
 class MinecraftLauncher:
+    SKIN_SYNC_WORKERS = 8
+    SKIN_ARCHIVE_THRESHOLD = 20  # С какого числа скинов выгоднее один архив
+
     def __init__(self, root):
         window_width = 800
         window_height = 560
@@ -30,8 +35,22 @@ class MinecraftLauncher:
         self.root.geometry(f'{window_width}x{window_height}+{x}+{y}')
         self.root.configure(bg='#2b2b2b')
 
+        self.setup_components(".minecraft")
+        
+        # Настройка интерфейса
+        self.setup_notebook()
+        
+        # Обновление данных
+        self.version_manager.refresh_versions()
+        self.refresh_modpacks_list()
+        
+        # Автоматическая синхронизация
+        self.root.after(1000, self.auto_sync_on_startup)
+    
+    def setup_components(self, minecraft_dir):
+        """Директории и компоненты лаунчера (без интерфейса)"""
         # Основные директории
-        self.MINECRAFT_DIR = ".minecraft"
+        self.MINECRAFT_DIR = minecraft_dir
         self.MODPACKS_DIR = os.path.join(self.MINECRAFT_DIR, "modpacks")
         self.MODS_CACHE_DIR = os.path.join(self.MINECRAFT_DIR, "mods_cache")
         self.SYNC_DIR = os.path.join(self.MINECRAFT_DIR, "sync")
@@ -45,20 +64,13 @@ class MinecraftLauncher:
         
         self.current_modpack = None
         # Инициализация компонентов
+        self.download_manager = DownloadManager(self)
+        self.mod_store = ModStore(self)
         self.curseforge_handler = CurseForgeHandler(self)
         self.api_client = APIClient(self)
         self.version_manager = VersionManager(self)
         self.skin_manager = SkinManager(self)
-        
-        # Настройка интерфейса
-        self.setup_notebook()
-        
-        # Обновление данных
-        self.version_manager.refresh_versions()
-        self.refresh_modpacks_list()
-        
-        # Автоматическая синхронизация
-        self.root.after(1000, self.auto_sync_on_startup)
+        self.skin_watcher = SkinWatcher(self)
     
     def log(self, message):
         """Унифицированное логирование"""
@@ -73,13 +85,15 @@ class MinecraftLauncher:
     def auto_sync_on_startup(self):
         """Автоматическая синхронизация при запуске"""
         try:
+            # Один полный проход при старте, дальше изменения приносит наблюдатель
+            self.skin_manager.prepare_local_skins_for_csl()
+            self.skin_watcher.start()
+            
             if self.api_client.test_connection():
                 self.log("Сервер синхронизации доступен")
                 threading.Thread(target=self.sync_all_data, daemon=True).start()
-                self.skin_manager.prepare_local_skins_for_csl()
             else:
                 self.log("Сервер недоступен, работаем офлайн")
-                self.skin_manager.prepare_local_skins_for_csl()
         except Exception as e:
             self.log(f"Ошибка при запуске синхронизации: {str(e)}")
 
@@ -93,59 +107,135 @@ class MinecraftLauncher:
         except Exception as e:
             self.log(f"Ошибка синхронизации: {str(e)}")
     
-    def sync_skins(self):
-        """Синхронизация скинов с сервером"""
+    def sync_skins(self, max_workers=None):
+        """Синхронизация скинов с сервером.
+
+        Скины качаются параллельно в пуле DownloadManager, ошибка одного
+        скина не прерывает остальные. Возвращает отчет с числом скачанных,
+        пропущенных (уже актуальных) и неудачных скинов.
+        """
+        report = {'total': 0, 'downloaded': 0, 'skipped': 0, 'failed': [], 'success': False}
         try:
-            manifest = self.api_client.get_skins_manifest()
-            if not manifest:
-                self.log("Не удалось получить манифест скинов")
-                return False
+            # Один манифест на весь проход, в том числе для запасного пути download_skin
+            sync_session = self.api_client.start_skin_sync()
+            manifest = sync_session.manifest
             
+            # Без ответа сервера и сохраненной копии манифест тоже пустой
             skins = manifest.get('skins', {})
             if not skins:
-                self.log("На сервере нет скинов для синхронизации")
-                return False
+                self.log("Нет скинов для синхронизации (сервер пуст или недоступен)")
+                return report
             
-            downloaded_count = 0
+            report['total'] = len(skins)
+            to_download = []
             for username, skin_info in skins.items():
                 skin_path = os.path.join(self.SKINS_SYNC_DIR, f"{username}.png")
                 
-                if os.path.exists(skin_path):
-                    with open(skin_path, 'rb') as f:
-                        local_hash = hashlib.md5(f.read()).hexdigest()
-                    
-                    if local_hash == skin_info.get('hash'):
-                        continue
+                # Неизменившиеся файлы сравниваются по индексу, без чтения
+                local_hash = self.skin_manager.skin_md5(skin_path)
+                if local_hash and local_hash == skin_info.get('hash'):
+                    report['skipped'] += 1
+                    continue
+                
+                to_download.append((username, skin_path))
+            
+            telemetry = self.download_manager.telemetry
+            batch = telemetry.begin("Синхронизация скинов", files=len(to_download))
+            
+            def download(task):
+                username, skin_path = task
+                batch.file_started()
+                ok = False
+                try:
+                    ok = self.api_client.download_skin(username, skin_path, session=sync_session)
+                    return ok
+                finally:
+                    batch.file_finished(ok)
+            
+            attempted = list(to_download)
+            try:
+                from_archive = 0
+                if len(to_download) >= self.SKIN_ARCHIVE_THRESHOLD:
+                    to_download, from_archive = self._sync_skins_from_archive(to_download, skins, batch)
                 
-                if self.api_client.download_skin(username, skin_path):
-                    downloaded_count += 1
+                results = self.download_manager.run_parallel(
+                    to_download, download,
+                    max_workers=max_workers or self.SKIN_SYNC_WORKERS)
+            finally:
+                telemetry.end(batch)
+                self.skin_manager.save_hash_index()
             
-            self.log(f"Синхронизация скинов завершена. Загружено: {downloaded_count}")
-            self.skin_manager.prepare_local_skins_for_csl()
+            report['downloaded'] = from_archive + len(results['succeeded'])
+            report['failed'] = [username for (username, _), _ in results['failed']]
+            report['success'] = not report['failed']
             
-            return True
+            self.log(f"Синхронизация скинов завершена. Загружено: {report['downloaded']}, "
+                     f"без изменений: {report['skipped']}, ошибок: {len(report['failed'])}")
+            if report['failed']:
+                self.log(f"Не удалось скачать скины: {', '.join(report['failed'][:5])}")
+            
+            # Раскладываем в CSL только то, что скачали, одним проходом после всей пачки
+            self.skin_manager.update_csl_skins([os.path.basename(path) for _, path in attempted])
+            
+            return report
             
         except Exception as e:
             self.log(f"Ошибка синхронизации скинов: {str(e)}")
-            return False
+            return report
+    
+    def _sync_skins_from_archive(self, to_download, skins, batch=None):
+        """Скачивает недостающие скины одним архивом.
+        
+        Возвращает (скины, которые еще нужно скачать по одному, число
+        скинов из архива). Если сервер не отдает архив - список не меняется.
+        """
+        usernames = {username for username, _ in to_download}
+        # Все скины сервера запрашиваются без списка имен (обычный GET)
+        extracted = self.api_client.download_skins_archive(
+            self.SKINS_SYNC_DIR, None if len(usernames) == len(skins) else usernames, batch=batch)
+        if extracted is None:
+            return to_download, 0
+        
+        remaining = []
+        for username, skin_path in to_download:
+            # md5 распакованного скина уже записан в индекс, файл не перечитывается
+            if username in extracted and self.skin_manager.skin_md5(skin_path) == skins[username].get('hash'):
+                if batch:
+                    batch.file_skipped()
+            else:
+                remaining.append((username, skin_path))
+        
+        self.log(f"Архив скинов: получено {len(to_download) - len(remaining)}, "
+                 f"осталось скачать по одному: {len(remaining)}")
+        return remaining, len(to_download) - len(remaining)
     
     def sync_modpacks(self):
-        """Синхронизация модпаков с сервером"""
+        """Синхронизация модпаков с сервером.
+
+        Список запрашивается один раз; архив, который уже скачан и не
+        изменился на сервере (размер и хэши из списка), повторно не качается.
+        """
         try:
             modpacks = self.api_client.get_modpacks_list()
             if not modpacks:
                 self.log("На сервере нет модпаков для синхронизации")
                 return
             
+            skipped = 0
             for modpack in modpacks:
                 modpack_id = modpack.get('id')
                 modpack_name = modpack.get('name')
                 
                 local_path = os.path.join(self.MODPACKS_DIR, modpack_name)
-                if not os.path.exists(local_path):
-                    self.log(f"Скачиваем модпак: {modpack_name}")
-                    self.api_client.download_modpack(modpack_id, self.MODPACKS_DIR)
+                if os.path.exists(local_path) or self.api_client.is_modpack_current(
+                        modpack, self.MODPACKS_DIR):
+                    skipped += 1
+                    continue
+                self.log(f"Скачиваем модпак: {modpack_name}")
+                self.api_client.download_modpack(modpack_id, self.MODPACKS_DIR, modpack)
             
+            if skipped:
+                self.log(f"Модпаки без изменений: {skipped}")
             self.refresh_modpacks_list()
             
         except Exception as e:
@@ -163,7 +253,10 @@ class MinecraftLauncher:
             skin_path = os.path.join(self.MINECRAFT_DIR, "skins", f"{username}.png")
         
         if os.path.exists(skin_path):
-            if self.api_client.upload_skin(skin_path, username):
+            result = self.api_client.upload_skin(skin_path, username)
+            if result == UPLOAD_UNCHANGED:
+                messagebox.showinfo("Успех", "Скин не изменился, загружать нечего")
+            elif result:
                 messagebox.showinfo("Успех", "Скин загружен на сервер")
             else:
                 messagebox.showerror("Ошибка", "Не удалось загрузить скин")
@@ -338,6 +431,9 @@ class MinecraftLauncher:
             if hasattr(self, 'modpack_selector_var'):
                 self.modpack_selector_var.set(modpack_name)
             
+            if hasattr(self, 'instance_mode_var'):
+                self.instance_mode_var.set(bool(info.get('instance_mode', False)))
+            
             if minecraft_version and minecraft_version != 'Не указана':
                 if minecraft_version in self.main_tab.version_combobox['values']:
                     self.main_tab.version_var.set(minecraft_version)
@@ -353,6 +449,43 @@ class MinecraftLauncher:
         except Exception as e:
             self.log(f"Ошибка при обновлении информации о модпаке: {str(e)}")
     
+    def toggle_instance_mode(self):
+        """Включение/выключение отдельной папки игры для текущего модпака"""
+        if not self.current_modpack:
+            self.instance_mode_var.set(False)
+            messagebox.showwarning("Внимание", "Сначала выберите модпак из списка")
+            return
+        
+        info_file = os.path.join(self.MODPACKS_DIR, self.current_modpack, "modpack_info.json")
+        try:
+            info = {}
+            if os.path.exists(info_file):
+                with open(info_file, 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+            info['instance_mode'] = bool(self.instance_mode_var.get())
+            with open(info_file, 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+            
+            state = "своя папка игры" if info['instance_mode'] else "общая папка .minecraft"
+            self.log(f"Модпак {self.current_modpack}: {state}")
+        except Exception as e:
+            self.log(f"Ошибка при сохранении настроек модпака: {str(e)}")
+    
+    def get_game_directory(self, modpack=None):
+        """Папка игры для модпака: своя в режиме экземпляра, иначе MINECRAFT_DIR"""
+        modpack = modpack or self.current_modpack
+        if not modpack:
+            return self.MINECRAFT_DIR
+        
+        info_file = os.path.join(self.MODPACKS_DIR, modpack, "modpack_info.json")
+        try:
+            with open(info_file, 'r', encoding='utf-8') as f:
+                if json.load(f).get('instance_mode'):
+                    return os.path.join(self.MODPACKS_DIR, modpack)
+        except (OSError, ValueError):
+            pass
+        return self.MINECRAFT_DIR
+    
     def quick_launch_modpack(self):
         """Быстрый запуск выбранного модпака"""
         try:
@@ -422,6 +555,9 @@ class MinecraftLauncher:
     
     # Делегируем методы SkinManager
     def prepare_local_skins_for_csl(self):
+        # Пока работает наблюдатель, LocalSkin уже актуален - полный обход не нужен
+        if self.skin_watcher.running:
+            return True
         return self.skin_manager.prepare_local_skins_for_csl()
     
     def test_csl_local_config(self):
@@ -431,6 +567,8 @@ class MinecraftLauncher:
         return self.skin_manager.setup_custom_skin_loader()
     
     def sync_skins_for_local_use(self):
+        if self.skin_watcher.running:
+            return True
         return self.skin_manager.sync_skins_for_local_use()
     
     def recreate_csl_config(self):
@@ -0,0 +1,70 @@
+import os
+import json
+import time
+import threading
+from typing import Any, Optional
+
+
+class MetadataCache:
+    """JSON-кэш метаданных на диске со сроком жизни записей и ограничением размера.
+
+    При превышении max_entries вытесняются записи, которые дольше всего
+    не запрашивались. Изменения пишутся на диск только вызовом save().
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = self._load()
+
+    def _load(self):
+        """Чтение кэша с диска; поврежденный файл считается пустым"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[Any]:
+        """Значение по ключу или None, если его нет или оно устарело"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            if now - entry['stored'] > self.ttl:
+                del self._entries[key]
+                self._dirty = True
+                return None
+            # Порядок вытеснения обновляется только в памяти: попадание
+            # не требует перезаписи файла, 'used' уйдет на диск со следующей записью
+            entry['used'] = now
+            return entry['data']
+
+    def set(self, key: str, data: Any):
+        """Сохраняет значение в памяти"""
+        now = time.time()
+        with self._lock:
+            self._entries[key] = {'data': data, 'stored': now, 'used': now}
+            self._dirty = True
+
+    def save(self):
+        """Вытесняет лишние записи и атомарно записывает кэш на диск"""
+        with self._lock:
+            if not self._dirty:
+                return
+            if len(self._entries) > self.max_entries:
+                by_use = sorted(self._entries, key=lambda k: self._entries[k]['used'])
+                for key in by_use[:len(self._entries) - self.max_entries]:
+                    del self._entries[key]
+
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
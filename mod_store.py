@@ -0,0 +1,142 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+from utils import link_or_copy
+
+
+class ModStore:
+    """Контентно-адресуемое хранилище jar-файлов в MODS_CACHE_DIR.
+
+    Каждый файл хранится один раз под своим SHA-1 (objects/ab/abcdef...),
+    а в папки mods/ модпаков попадает жесткой ссылкой на объект.
+    """
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self.root = launcher.MODS_CACHE_DIR
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.RLock()
+
+    def log(self, message):
+        """Логирование через лаунчер"""
+        if hasattr(self.launcher, 'log'):
+            self.launcher.log(message)
+        else:
+            print(f"[ModStore] {message}")
+
+    def object_path(self, sha1):
+        """Путь к объекту хранилища по его SHA-1"""
+        return os.path.join(self.objects_dir, sha1[:2], sha1)
+
+    def has(self, sha1):
+        """Есть ли объект с таким SHA-1 в хранилище"""
+        return bool(sha1) and os.path.exists(self.object_path(sha1.lower()))
+
+    def new_temp_path(self):
+        """Временный файл внутри хранилища (та же ФС, что и objects/)"""
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        os.close(fd)
+        return path
+
+    def temp_path_for(self, key):
+        """Постоянный временный путь для загрузки, чтобы ее можно было докачать"""
+        return os.path.join(self.tmp_dir, key)
+
+    def file_sha1(self, path):
+        """SHA-1 файла, читается блоками"""
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def add_file(self, src_path, move=False, sha1=None):
+        """Помещает файл в хранилище и возвращает его SHA-1.
+
+        move=True забирает файл (используется для временных загрузок),
+        иначе исходник копируется. Уже известный объект не дублируется.
+        """
+        sha1 = (sha1 or self.file_sha1(src_path)).lower()
+        obj_path = self.object_path(sha1)
+
+        with self._lock:
+            if os.path.exists(obj_path):
+                if move:
+                    os.remove(src_path)
+                return sha1
+
+            os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+            if move:
+                os.replace(src_path, obj_path)
+            else:
+                tmp_path = self.new_temp_path()
+                shutil.copy2(src_path, tmp_path)
+                os.replace(tmp_path, obj_path)
+
+        return sha1
+
+    def link_into(self, sha1, dest_path):
+        """Размещает объект хранилища по пути dest_path"""
+        obj_path = self.object_path(sha1.lower())
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+
+        if os.path.exists(dest_path):
+            if os.path.samefile(obj_path, dest_path):
+                return
+            os.remove(dest_path)
+
+        link_or_copy(obj_path, dest_path)
+
+    def is_placed(self, sha1, dest_path):
+        """dest_path уже содержит файл с этим SHA-1 (без SHA-1 - просто существует)"""
+        if not os.path.exists(dest_path):
+            return False
+        if not sha1:
+            return True
+        sha1 = sha1.lower()
+        if self.has(sha1) and os.path.samefile(self.object_path(sha1), dest_path):
+            return True
+        return self.file_sha1(dest_path) == sha1
+
+    def link_existing(self, sha1, dest_path):
+        """Размещает уже сохраненный объект, возвращает False если его нет"""
+        with self._lock:
+            if not self.has(sha1):
+                return False
+            self.link_into(sha1, dest_path)
+            return True
+
+    def store_and_link(self, src_path, dest_path, move=False, sha1=None):
+        """add_file + link_into, возвращает SHA-1"""
+        sha1 = sha1 or self.file_sha1(src_path)
+        with self._lock:
+            sha1 = self.add_file(src_path, move=move, sha1=sha1)
+            self.link_into(sha1, dest_path)
+        return sha1
+
+    def prune(self):
+        """Удаляет объекты, на которые больше не ссылается ни один модпак"""
+        with self._lock:
+            removed = self._prune_unlocked()
+        if removed:
+            self.log(f"Хранилище модов: удалено неиспользуемых файлов: {removed}")
+        return removed
+
+    def _prune_unlocked(self):
+        removed = 0
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if os.stat(path).st_nlink <= 1:
+                    os.remove(path)
+                    removed += 1
+        return removed
@@ -0,0 +1,45 @@
+import io
+from PIL import Image
+
+# Ширина классического скина; HD-скины кратны ей
+BASE_WIDTH = 64
+MAX_WIDTH = 1024
+
+
+class SkinImageError(ValueError):
+    """Файл не является допустимым скином"""
+
+
+def validate_skin_size(width, height):
+    """64x64 / 64x32 и HD-варианты с шириной, кратной 64"""
+    if width % BASE_WIDTH or not BASE_WIDTH <= width <= MAX_WIDTH:
+        raise SkinImageError(f"недопустимая ширина скина: {width}")
+    if height not in (width, width // 2):
+        raise SkinImageError(f"недопустимый размер скина: {width}x{height}")
+
+
+def normalize_skin(data: bytes) -> bytes:
+    """Проверяет скин и пересохраняет его как оптимизированный PNG.
+
+    Любой поддерживаемый Pillow формат (в том числе JPEG) переводится в PNG,
+    вспомогательные чанки (текст, EXIF, ICC, время, dpi) отбрасываются,
+    пиксели и прозрачность сохраняются без потерь.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception as e:
+        raise SkinImageError(f"не удалось прочитать изображение: {e}")
+
+    validate_skin_size(*image.size)
+
+    if image.mode not in ('RGBA', 'RGB', 'LA', 'L', 'P'):
+        image = image.convert('RGBA')
+
+    clean = image.copy()
+    # Из метаданных нужна только прозрачность палитры/цветового ключа
+    clean.info = {key: image.info[key] for key in ('transparency',) if key in image.info}
+
+    output = io.BytesIO()
+    clean.save(output, format='PNG', optimize=True, icc_profile=None)
+    return output.getvalue()
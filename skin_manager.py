@@ -1,7 +1,11 @@
 import os
 import shutil
 import json
+import hashlib
+import threading
 from datetime import datetime
+from utils import link_or_copy, is_same_file
+from skin_image import normalize_skin, SkinImageError
 
 class SkinManager:
     def __init__(self, launcher):
@@ -9,6 +13,14 @@ class SkinManager:
         self.MINECRAFT_DIR = launcher.MINECRAFT_DIR
         self.SKINS_SYNC_DIR = launcher.SKINS_SYNC_DIR
         
+        # Индекс md5 скинов папки синхронизации: имя -> [size, mtime_ns, md5]
+        self.hash_index_path = os.path.join(os.path.dirname(self.SKINS_SYNC_DIR), "skins_index.json")
+        self._hash_lock = threading.Lock()
+        self._hash_index = self._load_hash_index()
+        self._hash_index_dirty = False
+        # Раскладку в LocalSkin меняют синхронизация, запуск и наблюдатель за папками
+        self._csl_lock = threading.RLock()
+        
     def log(self, message):
         """Логирование через лаунчер"""
         if hasattr(self.launcher, 'log'):
@@ -16,6 +28,67 @@ class SkinManager:
         else:
             print(f"[SkinManager] {message}")
     
+    def _load_hash_index(self):
+        try:
+            with open(self.hash_index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def skin_md5(self, skin_path):
+        """md5 скина из папки синхронизации; файл читается, только если
+        его размер или mtime изменились с прошлого раза. None если файла нет"""
+        filename = os.path.basename(skin_path)
+        try:
+            stat = os.stat(skin_path)
+        except OSError:
+            with self._hash_lock:
+                if self._hash_index.pop(filename, None) is not None:
+                    self._hash_index_dirty = True
+            return None
+        
+        with self._hash_lock:
+            entry = self._hash_index.get(filename)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        
+        digest = hashlib.md5()
+        with open(skin_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        md5 = digest.hexdigest()
+        with self._hash_lock:
+            self._hash_index[filename] = [stat.st_size, stat.st_mtime_ns, md5]
+            self._hash_index_dirty = True
+        return md5
+    
+    def record_skin(self, skin_path, md5):
+        """Обновляет индекс после записи скина лаунчером (без повторного чтения).
+        
+        md5 - хэш записанных байтов (совпадает с хэшем в манифесте сервера)
+        """
+        if os.path.dirname(os.path.abspath(skin_path)) != os.path.abspath(self.SKINS_SYNC_DIR):
+            return
+        stat = os.stat(skin_path)
+        with self._hash_lock:
+            self._hash_index[os.path.basename(skin_path)] = [stat.st_size, stat.st_mtime_ns, md5]
+            self._hash_index_dirty = True
+    
+    def save_hash_index(self):
+        """Атомарно сохраняет индекс на диск, если он менялся"""
+        try:
+            with self._hash_lock:
+                if not self._hash_index_dirty:
+                    return
+                tmp_path = self.hash_index_path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._hash_index, f)
+                os.replace(tmp_path, self.hash_index_path)
+                self._hash_index_dirty = False
+        except Exception as e:
+            self.log(f"⚠️ Не удалось сохранить индекс скинов: {str(e)}")
+    
     def setup_custom_skin_loader(self):
         """Настройка Custom Skin Loader"""
         try:
@@ -116,39 +189,11 @@ class SkinManager:
                 self.log("⚠️ Папка синхронизации скинов не найдена")
                 return False
             
-            # Путь для скинов Custom Skin Loader
-            csl_dir = os.path.join(self.MINECRAFT_DIR, "CustomSkinLoader", "LocalSkin", "skins")
-            os.makedirs(csl_dir, exist_ok=True)
-            
             # Также создаем папку для плащей
             capes_dir = os.path.join(self.MINECRAFT_DIR, "CustomSkinLoader", "LocalSkin", "capes")
             os.makedirs(capes_dir, exist_ok=True)
             
-            skin_files = [f for f in os.listdir(sync_dir) if f.endswith('.png')]
-            self.log(f"Найдено {len(skin_files)} скинов в папке синхронизации")
-            
-            copied_count = 0
-            for skin_file in skin_files:
-                src = os.path.join(sync_dir, skin_file)
-                username = os.path.splitext(skin_file)[0]
-                
-                # Копируем скин с расширением .png
-                dst_with_ext = os.path.join(csl_dir, skin_file)
-                shutil.copy2(src, dst_with_ext)
-                
-                # Также копируем без расширения для совместимости с Legacy форматом
-                dst_no_ext = os.path.join(csl_dir, username)
-                shutil.copy2(src, dst_no_ext)
-                
-                copied_count += 1
-                self.log(f"Подготовлен скин для: {username}")
-            
-            self.log(f"✅ Подготовлено {copied_count} скинов в {csl_dir}")
-            
-            # Покажем содержимое папки для отладки
-            self.debug_skins_folder(csl_dir)
-            
-            return True
+            return self._update_csl_skins(legacy_names=True)
             
         except Exception as e:
             self.log(f"❌ Ошибка подготовки локальных скинов: {str(e)}")
@@ -159,23 +204,200 @@ class SkinManager:
     def sync_skins_for_local_use(self):
         """Создание локальных копий скинов (для использования в игре)"""
         try:
-            # Теперь используем правильный путь для CSL
-            skins_dir = os.path.join(self.MINECRAFT_DIR, "CustomSkinLoader", "LocalSkin", "skins")
-            os.makedirs(skins_dir, exist_ok=True)
+            return self._update_csl_skins(legacy_names=True)
+            
+        except Exception as e:
+            self.log(f"⚠️ Ошибка подготовки локальных скинов: {str(e)}")
+            return False
+    
+    def _update_csl_skins(self, legacy_names=True):
+        """Инкрементально раскладывает скины из папки синхронизации в LocalSkin/skins.
+        
+        Каждый скин кладется нормализованной копией как <имя>.png и,
+        для Legacy формата, как <имя> без расширения. Уже актуальные файлы
+        не трогаются, а разложенные раньше скины, которых больше нет
+        в папке синхронизации, удаляются.
+        """
+        with self._csl_lock:
+            csl_dir = self._csl_skins_dir()
+            placed_before = self._load_placed()
+            
+            placed = {}
+            updated = 0
+            for entry in os.scandir(self.SKINS_SYNC_DIR):
+                if not entry.name.endswith('.png') or not entry.is_file():
+                    continue
+                targets = self._csl_targets(entry.name, legacy_names)
+                updated += self._place_skin(entry.path, entry.stat(), csl_dir, targets,
+                                            placed_before, placed)
+            
+            removed = self._remove_targets(csl_dir, set(placed_before) - set(placed))
+            self._save_placed(placed_before, placed)
+        
+        skins_count = len(placed) // 2 if legacy_names else len(placed)
+        if updated or removed:
+            self.log(f"✅ Скины CSL: {skins_count} скинов, обновлено файлов {updated}, удалено {removed}")
+        return True
+    
+    def update_csl_skins(self, filenames, legacy_names=True):
+        """То же, что полная подготовка, но только для перечисленных файлов
+        папки синхронизации (изменившихся или удаленных), без обхода папки"""
+        with self._csl_lock:
+            csl_dir = self._csl_skins_dir()
+            placed_before = self._load_placed()
+            placed = dict(placed_before)
+            updated = removed = 0
             
-            for skin_file in os.listdir(self.SKINS_SYNC_DIR):
-                if skin_file.endswith('.png'):
-                    src = os.path.join(self.SKINS_SYNC_DIR, skin_file)
-                    dst = os.path.join(skins_dir, skin_file)
-                    shutil.copy2(src, dst)
+            for filename in filenames:
+                if not filename.endswith('.png'):
+                    continue
+                targets = self._csl_targets(filename, legacy_names)
+                src = os.path.join(self.SKINS_SYNC_DIR, filename)
+                try:
+                    src_stat = os.stat(src)
+                except OSError:
+                    removed += self._remove_targets(csl_dir, set(placed) & set(targets))
+                    for target in targets:
+                        placed.pop(target, None)
+                    continue
+                updated += self._place_skin(src, src_stat, csl_dir, targets, placed_before, placed)
             
-            self.log(f"✅ Локальные скины подготовлены: {skins_dir}")
+            self._save_placed(placed_before, placed)
+        if updated or removed:
+            self.log(f"✅ Скины CSL: обновлено файлов {updated}, удалено {removed}")
+        return True
+    
+    def share_csl_with_instance(self, game_dir):
+        """Делает папку CustomSkinLoader из .minecraft видимой в папке экземпляра.
+        
+        Конфиг и LocalSkin остаются общими: ссылка на каталог (symlink,
+        на Windows без прав - junction), в крайнем случае копия из ссылок
+        на файлы, обновляемая при каждом запуске.
+        """
+        source = os.path.join(self.MINECRAFT_DIR, "CustomSkinLoader")
+        target = os.path.join(game_dir, "CustomSkinLoader")
+        if os.path.abspath(source) == os.path.abspath(target):
             return True
+        try:
+            os.makedirs(source, exist_ok=True)
+            if self._is_dir_link(target):
+                if os.path.realpath(target) == os.path.realpath(source):
+                    return True
+                os.unlink(target)
+            
+            if not os.path.exists(target):
+                try:
+                    os.symlink(os.path.abspath(source), target, target_is_directory=True)
+                    return True
+                except (OSError, NotImplementedError):
+                    if os.name == 'nt':
+                        try:
+                            import _winapi
+                            _winapi.CreateJunction(os.path.abspath(source), target)
+                            return True
+                        except (OSError, ImportError):
+                            pass
             
+            def refresh_copy(src, dst):
+                if is_same_file(os.stat(src), dst):
+                    return
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                link_or_copy(src, dst)
+            
+            shutil.copytree(source, target, copy_function=refresh_copy, dirs_exist_ok=True)
+            return True
         except Exception as e:
-            self.log(f"⚠️ Ошибка подготовки локальных скинов: {str(e)}")
+            self.log(f"⚠️ Не удалось подключить CustomSkinLoader к папке модпака: {str(e)}")
             return False
     
+    def _is_dir_link(self, path):
+        if os.path.islink(path):
+            return True
+        isjunction = getattr(os.path, 'isjunction', None)  # Python 3.12+
+        return bool(isjunction and isjunction(path))
+    
+    def _csl_skins_dir(self):
+        csl_dir = os.path.join(self.MINECRAFT_DIR, "CustomSkinLoader", "LocalSkin", "skins")
+        os.makedirs(csl_dir, exist_ok=True)
+        return csl_dir
+    
+    def _csl_state_path(self):
+        # Список того, что разложил лаунчер: чужие файлы в папке CSL не удаляются
+        return os.path.join(self.MINECRAFT_DIR, "CustomSkinLoader", "LocalSkin", ".launcher_skins.json")
+    
+    def _load_placed(self):
+        """Разложенные файлы: имя в LocalSkin/skins -> [размер, mtime_ns] исходного скина"""
+        try:
+            with open(self._csl_state_path(), 'r', encoding='utf-8') as f:
+                placed = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if isinstance(placed, list):
+            # Старый формат - только имена: файлы будут переложены один раз
+            return {name: None for name in placed}
+        return placed if isinstance(placed, dict) else {}
+    
+    def _save_placed(self, placed_before, placed):
+        if placed == placed_before:
+            return
+        state_path = self._csl_state_path()
+        with open(state_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(placed, f, sort_keys=True)
+        os.replace(state_path + ".tmp", state_path)
+    
+    def _csl_targets(self, filename, legacy_names):
+        targets = [filename]
+        if legacy_names:
+            targets.append(os.path.splitext(filename)[0])
+        return targets
+    
+    def _place_skin(self, src, src_stat, csl_dir, targets, placed_before, placed):
+        """Кладет нормализованную копию src под каждым именем из targets.
+        
+        В папке синхронизации остаются байты сервера (их md5 сверяется с
+        манифестом), пережимается только копия для CSL. Актуальность
+        определяется по размеру и mtime исходника. Возвращает число
+        записанных файлов.
+        """
+        signature = [src_stat.st_size, src_stat.st_mtime_ns]
+        stale = [target for target in targets
+                 if placed_before.get(target) != signature
+                 or not os.path.lexists(os.path.join(csl_dir, target))]
+        for target in targets:
+            placed[target] = signature
+        if not stale:
+            return 0
+        
+        with open(src, 'rb') as f:
+            content = f.read()
+        try:
+            content = normalize_skin(content)
+        except SkinImageError as e:
+            self.log(f"Скин {os.path.basename(src)} разложен без обработки: {str(e)}")
+        
+        tmp_path = os.path.join(csl_dir, f".{targets[0]}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        try:
+            for target in stale:
+                dst = os.path.join(csl_dir, target)
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                link_or_copy(tmp_path, dst)
+        finally:
+            os.remove(tmp_path)
+        return len(stale)
+    
+    def _remove_targets(self, csl_dir, targets):
+        removed = 0
+        for target in targets:
+            path = os.path.join(csl_dir, target)
+            if os.path.isfile(path):
+                os.remove(path)
+                removed += 1
+        return removed
+    
     def debug_skins_folder(self, skins_dir):
         """Отладочная информация о папке скинов"""
         try:
@@ -0,0 +1,293 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+from api_client import UPLOAD_UNCHANGED
+
+# Маски inotify из <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyBackend:
+    """События изменения файлов через inotify (Linux, через ctypes)"""
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+
+        self._dirs = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch {directory}")
+            self._dirs[wd] = directory
+
+    def read(self, timeout):
+        """Список (папка, имя файла), пришедших за timeout секунд"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Очередь переполнилась, часть событий потеряна
+                events.extend((directory, None) for directory in self._dirs.values())
+            elif wd in self._dirs and name:
+                events.append((self._dirs[wd], os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+
+# ReadDirectoryChangesW (Windows)
+FILE_LIST_DIRECTORY = 0x0001
+FILE_SHARE_ALL = 0x00000001 | 0x00000002 | 0x00000004
+OPEN_EXISTING = 3
+FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+FILE_FLAG_OVERLAPPED = 0x40000000
+FILE_NOTIFY_CHANGE = 0x00000001 | 0x00000008 | 0x00000010  # имя, размер, запись
+WAIT_TIMEOUT = 0x00000102
+NOTIFY_HEADER = struct.Struct('III')
+
+
+class WindowsBackend:
+    """События изменения файлов через ReadDirectoryChangesW (асинхронно, через ctypes)"""
+
+    BUFFER_SIZE = 64 * 1024
+
+    class OVERLAPPED(ctypes.Structure):
+        _fields_ = [('Internal', ctypes.c_void_p), ('InternalHigh', ctypes.c_void_p),
+                    ('Offset', ctypes.c_uint32), ('OffsetHigh', ctypes.c_uint32),
+                    ('hEvent', ctypes.c_void_p)]
+
+    def __init__(self, directories):
+        from ctypes import wintypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        kernel32.CreateFileW.restype = wintypes.HANDLE
+        kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD,
+                                         ctypes.c_void_p, wintypes.DWORD, wintypes.DWORD,
+                                         wintypes.HANDLE]
+        kernel32.CreateEventW.restype = wintypes.HANDLE
+        kernel32.CreateEventW.argtypes = [ctypes.c_void_p, wintypes.BOOL, wintypes.BOOL,
+                                          wintypes.LPCWSTR]
+        kernel32.ReadDirectoryChangesW.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD,
+                                                   wintypes.BOOL, wintypes.DWORD, ctypes.c_void_p,
+                                                   ctypes.c_void_p, ctypes.c_void_p]
+        kernel32.WaitForMultipleObjects.restype = wintypes.DWORD
+        kernel32.WaitForMultipleObjects.argtypes = [wintypes.DWORD, ctypes.c_void_p,
+                                                    wintypes.BOOL, wintypes.DWORD]
+        kernel32.GetOverlappedResult.argtypes = [wintypes.HANDLE, ctypes.c_void_p,
+                                                 ctypes.POINTER(wintypes.DWORD), wintypes.BOOL]
+        kernel32.ResetEvent.argtypes = [wintypes.HANDLE]
+        kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, ctypes.c_void_p]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self._kernel32 = kernel32
+        self._watches = []
+
+        try:
+            for directory in directories:
+                handle = kernel32.CreateFileW(directory, FILE_LIST_DIRECTORY, FILE_SHARE_ALL, None,
+                                              OPEN_EXISTING,
+                                              FILE_FLAG_BACKUP_SEMANTICS | FILE_FLAG_OVERLAPPED, None)
+                if not handle or handle == ctypes.c_void_p(-1).value:
+                    raise ctypes.WinError(ctypes.get_last_error())
+                overlapped = self.OVERLAPPED()
+                overlapped.hEvent = kernel32.CreateEventW(None, True, False, None)
+                # Буфер DWORD-выровнен, как требует ReadDirectoryChangesW
+                buffer = (ctypes.c_uint32 * (self.BUFFER_SIZE // 4))()
+                watch = {'dir': directory, 'handle': handle, 'overlapped': overlapped,
+                         'buffer': buffer}
+                self._watches.append(watch)
+                self._request(watch)
+        except Exception:
+            self.close()
+            raise
+        self._events = (ctypes.c_void_p * len(self._watches))(
+            *[watch['overlapped'].hEvent for watch in self._watches])
+
+    def _request(self, watch):
+        ok = self._kernel32.ReadDirectoryChangesW(
+            watch['handle'], ctypes.byref(watch['buffer']), self.BUFFER_SIZE, False,
+            FILE_NOTIFY_CHANGE, None, ctypes.byref(watch['overlapped']), None)
+        if not ok:
+            raise ctypes.WinError(ctypes.get_last_error())
+
+    def read(self, timeout):
+        """Список (папка, имя файла), пришедших за timeout секунд"""
+        from ctypes import wintypes
+        result = self._kernel32.WaitForMultipleObjects(len(self._watches), self._events, False,
+                                                       int(timeout * 1000))
+        if result == WAIT_TIMEOUT or result >= len(self._watches):
+            return []
+
+        watch = self._watches[result]
+        transferred = wintypes.DWORD()
+        self._kernel32.GetOverlappedResult(watch['handle'], ctypes.byref(watch['overlapped']),
+                                           ctypes.byref(transferred), False)
+        self._kernel32.ResetEvent(watch['overlapped'].hEvent)
+
+        events = []
+        if transferred.value == 0:
+            # Буфер переполнился, часть событий потеряна
+            events.append((watch['dir'], None))
+        else:
+            data = ctypes.string_at(watch['buffer'], transferred.value)
+            offset = 0
+            while True:
+                next_offset, _action, length = NOTIFY_HEADER.unpack_from(data, offset)
+                start = offset + NOTIFY_HEADER.size
+                events.append((watch['dir'], data[start:start + length].decode('utf-16-le')))
+                if not next_offset:
+                    break
+                offset += next_offset
+        self._request(watch)
+        return events
+
+    def close(self):
+        for watch in self._watches:
+            self._kernel32.CancelIoEx(watch['handle'], None)
+            self._kernel32.CloseHandle(watch['handle'])
+            if watch['overlapped'].hEvent:
+                self._kernel32.CloseHandle(watch['overlapped'].hEvent)
+        self._watches = []
+
+
+class SkinWatcher:
+    """Следит за папками скинов и переносит изменения без полных пересканирований.
+
+    Изменения в SKINS_SYNC_DIR сразу раскладываются в LocalSkin/skins
+    (только затронутые файлы). Если включена автозагрузка, изменение
+    собственного скина в .minecraft/skins отправляется на сервер.
+    Пачка записей подряд склеивается в одно действие через DEBOUNCE.
+    """
+    DEBOUNCE = 0.5
+
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self.sync_dir = os.path.abspath(launcher.SKINS_SYNC_DIR)
+        self.local_dir = os.path.abspath(os.path.join(launcher.MINECRAFT_DIR, "skins"))
+        self._stop = threading.Event()
+        self._thread = None
+        self.backend_name = None
+
+    def log(self, message):
+        """Логирование через лаунчер"""
+        if hasattr(self.launcher, 'log'):
+            self.launcher.log(message)
+        else:
+            print(f"[SkinWatcher] {message}")
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Запускает наблюдение в фоновом потоке; повторный вызов ничего не делает"""
+        if self.running:
+            return True
+        try:
+            for directory in (self.sync_dir, self.local_dir):
+                os.makedirs(directory, exist_ok=True)
+            backend = self._create_backend([self.sync_dir, self.local_dir])
+        except Exception as e:
+            self.log(f"⚠️ Наблюдение за папками скинов недоступно: {str(e)}")
+            return False
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(backend,), daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _create_backend(self, directories):
+        """Родной механизм уведомлений ОС; без него наблюдение не запускается
+        и LocalSkin обновляется полными проходами при синхронизации и запуске"""
+        if sys.platform.startswith('linux'):
+            backend = InotifyBackend(directories)
+            self.backend_name = "inotify"
+            return backend
+        if sys.platform == 'win32':
+            backend = WindowsBackend(directories)
+            self.backend_name = "ReadDirectoryChangesW"
+            return backend
+        raise OSError(f"нет системных уведомлений об изменениях файлов для {sys.platform}")
+
+    def _run(self, backend):
+        pending = set()
+        last_event = 0.0
+        try:
+            while not self._stop.is_set():
+                events = backend.read(self.DEBOUNCE if pending else 1.0)
+                now = time.monotonic()
+                if events:
+                    pending.update(events)
+                    last_event = now
+                if pending and now - last_event >= self.DEBOUNCE:
+                    batch, pending = pending, set()
+                    self._handle(batch)
+        finally:
+            backend.close()
+
+    def _handle(self, events):
+        """Одна обработка на пачку событий"""
+        try:
+            if (self.sync_dir, None) in events:
+                self.launcher.skin_manager.prepare_local_skins_for_csl()
+                events = {event for event in events if event[1] is not None}
+
+            synced = {name for directory, name in events
+                      if directory == self.sync_dir and name and name.endswith('.png')}
+            if synced:
+                self.launcher.skin_manager.update_csl_skins(sorted(synced))
+
+            local = {name for directory, name in events
+                     if directory == self.local_dir and name and name.endswith('.png')}
+            if local:
+                self._maybe_upload_own_skin(local)
+        except Exception as e:
+            self.log(f"⚠️ Ошибка обработки изменений скинов: {str(e)}")
+
+    def _maybe_upload_own_skin(self, filenames):
+        api_client = self.launcher.api_client
+        owner = api_client.username
+        if not api_client.auto_upload_skin or not owner or f"{owner}.png" not in filenames:
+            return
+
+        skin_path = os.path.join(self.local_dir, f"{owner}.png")
+        if not os.path.exists(skin_path):
+            return
+        self.log(f"Скин {owner} изменился, загружаем на сервер...")
+        result = api_client.upload_skin(skin_path, owner)
+        if result == UPLOAD_UNCHANGED:
+            self.log("Скин не изменился, загрузка не нужна")
+        elif result:
+            self.log("✅ Скин загружен на сервер")
@@ -3,11 +3,12 @@ from tkinter import ttk, filedialog, messagebox
 import os
 import shutil
 import json
+import hashlib
 from datetime import datetime
-from utils import InsecureSession
 import ttkbootstrap as ttkb
 from ttkbootstrap.constants import *
 import threading
+from api_client import UPLOAD_UNCHANGED
 
 
 class BaseTab:
@@ -183,6 +184,12 @@ class MainTab(BaseTab):
                                         text="Модпак не выбран",
                                         font=("Segoe UI", 8))
         self.launcher.modpack_info_label.pack(anchor="w", pady=(5, 0))
+        
+        # Режим экземпляра: модпак запускается из своей папки, не трогая .minecraft/mods
+        self.launcher.instance_mode_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(parent, text="Отдельная папка игры (можно запускать вместе с другими)",
+                       variable=self.launcher.instance_mode_var,
+                       command=self.launcher.toggle_instance_mode).pack(anchor="w", pady=(2, 0))
     
     def setup_control_block_compact(self, parent):
         button_frame = ttk.Frame(parent)
@@ -444,7 +451,7 @@ class ModsTab(BaseTab):
                 os.makedirs(dest_dir, exist_ok=True)
                 dest_path = os.path.join(dest_dir, mod_name)
                 
-                shutil.copy2(file_path, dest_path)
+                self.launcher.mod_store.store_and_link(file_path, dest_path)
                 self.launcher.main_tab.log(f"Мод {mod_name} добавлен")
                 self.refresh_mods_list()
                 
@@ -482,11 +489,12 @@ class ModsTab(BaseTab):
                 
                 try:
                     self.launcher.main_tab.log(f"Загрузка мода из {url}...")
-                    session = InsecureSession()
-                    response = session.get(url, stream=True, timeout=30)
+                    store = self.launcher.mod_store
+                    tmp_path = store.temp_path_for(hashlib.sha1(url.encode()).hexdigest() + ".jar")
+                    result = self.launcher.download_manager.download_file(url, tmp_path)
                     
-                    if 'Content-Disposition' in response.headers:
-                        content_disposition = response.headers['Content-Disposition']
+                    if 'Content-Disposition' in result['headers']:
+                        content_disposition = result['headers']['Content-Disposition']
                         filename = content_disposition.split('filename=')[1].strip('"')
                     else:
                         filename = os.path.basename(url)
@@ -502,14 +510,7 @@ class ModsTab(BaseTab):
                     os.makedirs(dest_dir, exist_ok=True)
                     dest_path = os.path.join(dest_dir, filename)
                     
-                    total_size = int(response.headers.get('content-length', 0))
-                    downloaded = 0
-                    
-                    with open(dest_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                                downloaded += len(chunk)
+                    store.store_and_link(tmp_path, dest_path, move=True, sha1=result['hashes']['sha1'])
                     
                     self.launcher.main_tab.log(f"Мод {filename} успешно загружен")
                     self.refresh_mods_list()
@@ -956,6 +957,7 @@ class ModpacksTab(BaseTab):
                 
                 if os.path.exists(modpack_path):
                     shutil.rmtree(modpack_path)
+                    self.launcher.mod_store.prune()
                     
                     if self.launcher.current_modpack == modpack_name:
                         self.launcher.current_modpack = None
@@ -1092,7 +1094,7 @@ class SyncTab(BaseTab):
         self.prepare_csl_btn = tk.Button(
             self.frame,
             text="Подготовить скины для CSL",
-            command=self.launcher.prepare_local_skins_for_csl
+            command=self.launcher.skin_manager.prepare_local_skins_for_csl
         )
         self.prepare_csl_btn.pack(pady=5)
 
@@ -1136,7 +1138,7 @@ class SyncTab(BaseTab):
         csl_frame.pack(fill="x", pady=5)
         
         ttk.Button(csl_frame, text="🛠️ Подготовить скины для CSL", 
-                  command=self.launcher.prepare_local_skins_for_csl,
+                  command=self.launcher.skin_manager.prepare_local_skins_for_csl,
                   bootstyle="info", width=20).pack(side="left", padx=2)
         
         ttk.Button(csl_frame, text="🔧 Тест конфига CSL", 
@@ -1147,6 +1149,12 @@ class SyncTab(BaseTab):
                   command=self.launcher.recreate_csl_config,
                   bootstyle="warning", width=18).pack(side="left", padx=2)
         
+        # Автозагрузка своего скина при изменении .minecraft/skins/<имя>.png
+        self.auto_upload_var = tk.BooleanVar(value=self.launcher.api_client.auto_upload_skin)
+        ttk.Checkbutton(skins_frame, text="Автоматически загружать мой скин при изменении",
+                       variable=self.auto_upload_var,
+                       command=self.toggle_auto_upload).pack(anchor="w", pady=(5, 0))
+        
         # Текущий пользователь
         user_frame = ttk.Frame(skins_frame)
         user_frame.pack(fill="x", pady=(10, 0))
@@ -1177,6 +1185,13 @@ class SyncTab(BaseTab):
         # Обновляем статус пользователя
         self.update_user_status()
     
+    def toggle_auto_upload(self):
+        """Включение/выключение автозагрузки своего скина"""
+        self.launcher.api_client.auto_upload_skin = self.auto_upload_var.get()
+        self.launcher.api_client.save_config()
+        state = "включена" if self.auto_upload_var.get() else "выключена"
+        self.log(f"Автозагрузка скина {state}")
+    
     def toggle_api_visibility(self):
         """Переключение видимости API ключа"""
         if self.show_api_var.get():
@@ -1324,7 +1339,10 @@ class SyncTab(BaseTab):
     def _upload_skin_thread(self):
         """Поток загрузки скина"""
         try:
-            if self.launcher.api_client.upload_skin(self.selected_skin_path):
+            result = self.launcher.api_client.upload_skin(self.selected_skin_path)
+            if result == UPLOAD_UNCHANGED:
+                self.log("ℹ️ Скин на сервере уже такой же, загрузка не нужна")
+            elif result:
                 self.log("✅ Скин успешно загружен на сервер!")
             else:
                 self.log("❌ Не удалось загрузить скин")
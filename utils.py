@@ -5,6 +5,10 @@ import urllib3
 import requests
 import minecraft_launcher_lib as mclib
 import subprocess
+import shutil
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 ssl._create_default_https_context = ssl._create_unverified_context
 warnings.filterwarnings("ignore")
@@ -14,20 +18,65 @@ os.environ['PYTHONHTTPSVERIFY'] = '0'
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+DEFAULT_TIMEOUT = 30
+
 class InsecureSession(requests.Session):
-    def __init__(self):
+    """Сессия без проверки SSL с пулами соединений, повторами и таймаутом по умолчанию"""
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_retries=3, pool_maxsize=16):
         super().__init__()
         self.verify = False
-        self.timeout = 30
-        self.max_retries = 3
+        self.timeout = timeout
+        # Повторяются только идемпотентные запросы; POST (загрузки, логин) - нет
+        retry = Retry(
+            total=max_retries,
+            connect=1,
+            # Таймаут чтения не повторяется: молчащий сервер иначе держит вызов (timeout + пауза) x N
+            read=0,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+            raise_on_status=False
+        )
+        # Пул keep-alive соединений на каждый хост
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
 
 requests.Session = InsecureSession
 
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+def get_session():
+    """Общая для всего лаунчера HTTP-сессия (соединения переиспользуются между модулями)"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = InsecureSession()
+        return _shared_session
+
+_download_session = None
+
+def get_download_session():
+    """Сессия для потоковых загрузок DownloadManager.
+    
+    Повторы делает сам DownloadManager (с докачкой .part), поэтому адаптер
+    здесь ничего не повторяет - иначе два слоя повторов перемножаются.
+    """
+    global _download_session
+    with _shared_session_lock:
+        if _download_session is None:
+            _download_session = InsecureSession(max_retries=0)
+        return _download_session
+
 original_get_requests = mclib._helper.get_requests_response_cache
 
 def insecure_get_requests(url: str):
-    session = InsecureSession()
-    response = session.get(url)
+    response = get_session().get(url)
     response.raise_for_status()
     return response
 
@@ -38,4 +87,33 @@ def check_java_installed():
         result = subprocess.run(['java', '-version'], capture_output=True, text=True)
         return result.returncode == 0
     except Exception:
-        return False
\ No newline at end of file
+        return False
+
+def link_or_copy(src, dst, symlink=False):
+    """Создает жесткую ссылку src -> dst, при невозможности копирует файл.
+    
+    С symlink=True между ними пробуется символьная ссылка (разные диски).
+    """
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    if symlink:
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            return
+        except (OSError, NotImplementedError):
+            pass
+    shutil.copy2(src, dst)
+
+def is_same_file(src_stat, dst):
+    """dst - ссылка на тот же файл или его копия с тем же размером и mtime"""
+    try:
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+    if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+        return True
+    return (src_stat.st_size == dst_stat.st_size
+            and src_stat.st_mtime_ns == dst_stat.st_mtime_ns)
@@ -1,20 +1,24 @@
 import os
-import shutil
 import subprocess
 import threading
-import tempfile
 import json
 import socket
 import re
 import xml.etree.ElementTree as ET
 import requests
+from utils import get_session, link_or_copy, is_same_file
 import minecraft_launcher_lib as mclib
+from download_manager import DownloadError
+from launch_plan import LaunchPlanCache
+from jvm_tuning import JvmTuner
+from app_cds import AppCDSArchives
 from tkinter import messagebox
 from pathlib import Path
 
 class VersionManager:
     def __init__(self, launcher):
         self.launcher = launcher
+        self.session = get_session()
         self.modloader_versions = {
             "Forge": [],
             "NeoForge": [],
@@ -26,6 +30,12 @@ class VersionManager:
         self.cache_dir = os.path.join(launcher.MINECRAFT_DIR, "launcher_cache")
         os.makedirs(self.cache_dir, exist_ok=True)
         self.neoforge_cache_file = os.path.join(self.cache_dir, "neoforge_versions.json")
+        self.launch_plans = LaunchPlanCache(launcher, self.cache_dir)
+        self.jvm_tuner = JvmTuner(launcher)
+        self.app_cds = AppCDSArchives(launcher, self.cache_dir, self.launch_plans)
+        # Папки игры, из которых сейчас запущен Minecraft (по одному процессу на папку)
+        self.running_game_dirs = set()
+        self._running_lock = threading.Lock()
 
     def log(self, message):
         """Логирование через лаунчер"""
@@ -261,7 +271,7 @@ class VersionManager:
         # Пробуем получить версии из нового API (neoforge)
         try:
             metadata_url = "https://maven.neoforged.net/releases/net/neoforged/neoforge/maven-metadata.xml"
-            response = requests.get(metadata_url, timeout=15)
+            response = self.session.get(metadata_url, timeout=15)
             response.raise_for_status()
             
             root = ET.fromstring(response.content)
@@ -309,7 +319,7 @@ class VersionManager:
         if not all_versions:
             try:
                 metadata_url = "https://maven.neoforged.net/releases/net/neoforged/neoforge/maven-metadata.xml"
-                response = requests.get(metadata_url, timeout=15)
+                response = self.session.get(metadata_url, timeout=15)
                 response.raise_for_status()
                 
                 root = ET.fromstring(response.content)
@@ -337,7 +347,7 @@ class VersionManager:
         """Fallback метод получения версий через HTML парсинг"""
         url = "https://maven.neoforged.net/releases/net/neoforged/neoforge/"
         
-        response = requests.get(url, timeout=10)
+        response = self.session.get(url, timeout=10)
         response.raise_for_status()
         
         pattern = re.compile(r'<a href="([^"]+)/">')
@@ -493,20 +503,25 @@ class VersionManager:
 
             os.makedirs(self.launcher.MINECRAFT_DIR, exist_ok=True)
 
-            callback = {
-                'setStatus': lambda text: self.launcher.root.after(0, self.launcher.main_tab.set_status, text)
-            }
+            # Статус mclib приходит на каждый файл; в интерфейс его
+            # публикует телеметрия загрузок с фиксированной частотой
+            telemetry = self.launcher.download_manager.telemetry
+            batch = telemetry.begin(f"Установка Minecraft {minecraft_version}")
+            try:
+                callback = batch.mclib_callback()
 
-            if not self.is_version_installed(minecraft_version, "Vanilla"):
-                mclib.install.install_minecraft_version(minecraft_version,
-                                                       self.launcher.MINECRAFT_DIR,
-                                                       callback=callback)
-                self.log(f"Minecraft {minecraft_version} успешно установлен!")
-            else:
-                self.log(f"Minecraft {minecraft_version} уже установлен")
+                if not self.is_version_installed(minecraft_version, "Vanilla"):
+                    mclib.install.install_minecraft_version(minecraft_version,
+                                                           self.launcher.MINECRAFT_DIR,
+                                                           callback=callback)
+                    self.log(f"Minecraft {minecraft_version} успешно установлен!")
+                else:
+                    self.log(f"Minecraft {minecraft_version} уже установлен")
 
-            if modloader != "Vanilla":
-                self.install_modloader(minecraft_version, modloader, modloader_version, callback)
+                if modloader != "Vanilla":
+                    self.install_modloader(minecraft_version, modloader, modloader_version, callback)
+            finally:
+                telemetry.end(batch, summary=False)
 
             self.launcher.main_tab.set_status(f"Установка завершена")
 
@@ -658,55 +673,55 @@ class VersionManager:
             installer_url = (f"https://maven.neoforged.net/releases/net/neoforged/{artifact_name}/"
                              f"{neoforge_full_version}/{installer_filename}")
 
-            with tempfile.TemporaryDirectory() as temp_dir:
-                installer_path = os.path.join(temp_dir, f"neoforge-installer-{neoforge_full_version}.jar")
+            # Установщик хранится в кэше: оборванная загрузка докачивается,
+            # повторная установка не скачивает его заново
+            installers_dir = os.path.join(self.cache_dir, "installers")
+            installer_path = os.path.join(installers_dir, installer_filename)
 
-                # Скачиваем установщик
+            # Скачиваем установщик
+            if not os.path.exists(installer_path):
                 self.launcher.main_tab.set_status(f"Скачивание установщика NeoForge...")
                 self.log(f"Скачивание {installer_url}")
-                response = requests.get(installer_url, stream=True)
-                response.raise_for_status()
-
-                with open(installer_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+                self.launcher.download_manager.download_file(
+                    installer_url, installer_path, timeout=60,
+                    expected_hashes=self._get_maven_sha1(installer_url))
 
                 self.log("Установщик NeoForge успешно скачан")
 
-                # Запускаем установщик в тихом режиме
-                self.launcher.main_tab.set_status(f"Запуск установщика NeoForge...")
-                self.log("Запуск процесса установки NeoForge")
+            # Запускаем установщик в тихом режиме
+            self.launcher.main_tab.set_status(f"Запуск установщика NeoForge...")
+            self.log("Запуск процесса установки NeoForge")
 
-                install_command = [
-                    "java",  # предполагается, что Java в PATH
-                    "-jar",
-                    installer_path,
-                    "--installClient",
-                    self.launcher.MINECRAFT_DIR
-                ]
+            install_command = [
+                "java",  # предполагается, что Java в PATH
+                "-jar",
+                installer_path,
+                "--installClient",
+                self.launcher.MINECRAFT_DIR
+            ]
 
-                process = subprocess.Popen(
-                    install_command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    bufsize=1,
-                    encoding='utf-8',
-                    errors='replace'
-                )
+            process = subprocess.Popen(
+                install_command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+                bufsize=1,
+                encoding='utf-8',
+                errors='replace'
+            )
 
-                for line in process.stdout:
-                    if line.strip():
-                        self.log(f"[NeoForge Installer] {line.strip()}")
+            for line in process.stdout:
+                if line.strip():
+                    self.log(f"[NeoForge Installer] {line.strip()}")
 
-                process.wait()
+            process.wait()
 
-                if process.returncode != 0:
-                    raise Exception(f"Установщик NeoForge завершился с ошибкой (код {process.returncode})")
+            if process.returncode != 0:
+                raise Exception(f"Установщик NeoForge завершился с ошибкой (код {process.returncode})")
 
-                self.log(f"NeoForge {neoforge_full_version} успешно установлен!")
+            self.log(f"NeoForge {neoforge_full_version} успешно установлен!")
 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, DownloadError) as e:
             self.log(f"Ошибка при скачивании установщика NeoForge: {str(e)}")
             messagebox.showerror("Ошибка", f"Не удалось скачать установщик NeoForge:\n{e}")
             raise
@@ -719,6 +734,18 @@ class VersionManager:
             messagebox.showerror("Ошибка", f"Ошибка установки NeoForge:\n{e}")
             raise
 
+    def _get_maven_sha1(self, artifact_url):
+        """SHA-1 артефакта из файла .sha1 рядом с ним в Maven (если есть)"""
+        try:
+            response = self.session.get(artifact_url + ".sha1", timeout=10)
+            if response.status_code == 200:
+                value = response.text.strip().split()[0].lower()
+                if re.fullmatch(r'[0-9a-f]{40}', value):
+                    return {'sha1': value}
+        except Exception as e:
+            self.log(f"Не удалось получить .sha1 для {artifact_url}: {e}")
+        return {}
+
     def _ensure_launcher_profiles_exists(self):
         """Создает минимальный launcher_profiles.json, если он отсутствует"""
         profiles_file = os.path.join(self.launcher.MINECRAFT_DIR, "launcher_profiles.json")
@@ -791,17 +818,66 @@ class VersionManager:
                 self.log("После установки нажмите 'Запуск Minecraft' снова.")
             return
 
+        game_dir = self.launcher.get_game_directory()
+        with self._running_lock:
+            if game_dir in self.running_game_dirs:
+                self.log(f"Minecraft уже запущен из папки {game_dir}")
+                messagebox.showwarning("Внимание",
+                    "Игра из этой папки уже запущена.\n"
+                    "Для одновременного запуска включите для модпака отдельную папку игры.")
+                return
+            self.running_game_dirs.add(game_dir)
+
         if hasattr(self.launcher.main_tab, 'launch_button'):
             self.launcher.main_tab.launch_button.config(state="disabled")
         if hasattr(self.launcher.main_tab, 'install_button'):
             self.launcher.main_tab.install_button.config(state="disabled")
 
         threading.Thread(target=self._launch_minecraft_thread,
-                        args=(minecraft_version, modloader, username, uuid, token),
+                        args=(minecraft_version, modloader, username, uuid, token, game_dir),
                         daemon=True).start()
 
-    def _launch_minecraft_thread(self, minecraft_version, modloader, username, uuid, token):
-        """Поток запуска Minecraft"""
+    def activate_modpack_mods(self, modpack_mods_dir, working_mods_dir):
+        """Приводит working_mods_dir к набору .jar из сборки.
+        
+        Меняются только отличающиеся файлы, новые ставятся ссылками
+        (жесткая, символьная, копия). Повторный запуск той же сборки
+        обходится чтением каталогов без записи.
+        """
+        os.makedirs(working_mods_dir, exist_ok=True)
+        wanted = {file for file in os.listdir(modpack_mods_dir) if file.endswith('.jar')}
+        removed = linked = 0
+
+        for file in os.listdir(working_mods_dir):
+            if file.endswith('.jar') and file not in wanted:
+                os.remove(os.path.join(working_mods_dir, file))
+                removed += 1
+
+        for file in sorted(wanted):
+            src = os.path.join(modpack_mods_dir, file)
+            dst = os.path.join(working_mods_dir, file)
+            if is_same_file(os.stat(src), dst):
+                continue
+            if os.path.lexists(dst):
+                os.remove(dst)
+            link_or_copy(src, dst, symlink=True)
+            linked += 1
+
+        if removed or linked:
+            self.log(f"Моды сборки: добавлено/обновлено {linked}, удалено {removed}, "
+                     f"без изменений {len(wanted) - linked}")
+        else:
+            self.log(f"Моды сборки уже на месте ({len(wanted)})")
+        return {'linked': linked, 'removed': removed, 'unchanged': len(wanted) - linked}
+
+    def _launch_minecraft_thread(self, minecraft_version, modloader, username, uuid, token,
+                                 game_dir=None):
+        """Поток запуска Minecraft.
+        
+        game_dir, отличная от MINECRAFT_DIR, - папка модпака в режиме экземпляра:
+        моды берутся из нее напрямую, библиотеки, ассеты и версии остаются общими.
+        """
+        game_dir = game_dir or self.launcher.MINECRAFT_DIR
         try:
             self.launcher.main_tab.set_status("Подготовка к запуску...")
             self.log("Настройка отображения скинов...")
@@ -809,57 +885,37 @@ class VersionManager:
             self.launcher.setup_skin_loader(minecraft_version, modloader)
             self.launcher.sync_skins_for_local_use()
 
-            installed_versions = mclib.utils.get_installed_versions(self.launcher.MINECRAFT_DIR)
-            launch_version = minecraft_version
-
-            if modloader == "Forge":
-                for v in installed_versions:
-                    if "forge" in v['id'].lower() and minecraft_version in v['id']:
-                        launch_version = v['id']
-                        break
-            elif modloader == "Fabric":
-                for v in installed_versions:
-                    if "fabric" in v['id'].lower():
-                        launch_version = v['id']
-                        break
-            elif modloader == "NeoForge":
-                for v in installed_versions:
-                    vid = v['id'].lower()
-                    if ("neoforge" in vid or "neoformed" in vid) and minecraft_version in v['id']:
-                        launch_version = v['id']
-                        break
+            launch_version = self.launch_plans.resolve_launch_version(minecraft_version, modloader)
 
             options = {
                 "username": username,
                 "uuid": uuid if uuid else "",
                 "token": token if token else "",
-                "jvmArguments": ["-Xmx16G", "-Xms10G"],
-                "gameDirectory": self.launcher.MINECRAFT_DIR
+                "jvmArguments": self.jvm_tuner.jvm_arguments(minecraft_version,
+                                                             self.launcher.current_modpack),
+                "gameDirectory": game_dir
             }
 
-            if self.launcher.current_modpack:
+            if game_dir != self.launcher.MINECRAFT_DIR:
+                self.log(f"Папка игры: {game_dir}")
+                self.launcher.skin_manager.share_csl_with_instance(game_dir)
+            elif self.launcher.current_modpack:
                 modpack_mods_dir = os.path.join(self.launcher.MODPACKS_DIR,
                                               self.launcher.current_modpack,
                                               "mods")
                 if os.path.exists(modpack_mods_dir):
                     working_mods_dir = os.path.join(self.launcher.MINECRAFT_DIR, "mods")
-                    os.makedirs(working_mods_dir, exist_ok=True)
-
-                    for file in os.listdir(working_mods_dir):
-                        if file.endswith('.jar'):
-                            os.remove(os.path.join(working_mods_dir, file))
-
-                    for file in os.listdir(modpack_mods_dir):
-                        if file.endswith('.jar'):
-                            shutil.copy2(os.path.join(modpack_mods_dir, file),
-                                       os.path.join(working_mods_dir, file))
+                    self.activate_modpack_mods(modpack_mods_dir, working_mods_dir)
 
             self.log(f"Используется версия: {launch_version}")
 
             try:
-                minecraft_command = mclib.command.get_minecraft_command(launch_version,
-                                                                       self.launcher.MINECRAFT_DIR,
-                                                                       options)
+                minecraft_command = self.launch_plans.get_command(launch_version, options)
+                cds_archive = None
+                if self.jvm_tuner.modpack_overrides(self.launcher.current_modpack).get('appcds'):
+                    minecraft_command, cds_archive = self.app_cds.prepare(
+                        minecraft_command, launch_version, minecraft_version, game_dir,
+                        self.launcher.current_modpack)
             except Exception as e:
                 self.log(f"Ошибка при генерации команды: {str(e)}")
                 self.launcher.root.after(0, lambda: messagebox.showerror("Ошибка",
@@ -878,12 +934,15 @@ class VersionManager:
                 encoding='utf-8',
                 errors='replace'
             )
+            self._enable_launch_buttons()
 
             for line in process.stdout:
                 if line.strip():
                     self.log(f"> {line.strip()}")
 
             process.wait()
+            if cds_archive:
+                self.app_cds.finish(cds_archive, process.returncode)
             self.log("Игра завершена.")
             self.launcher.main_tab.set_status("Готов к работе")
 
@@ -894,8 +953,14 @@ class VersionManager:
             self.launcher.root.after(0, lambda: messagebox.showerror("Ошибка запуска",
                 f"Не удалось запустить Minecraft:\n{str(e)}"))
         finally:
-            if self.launcher.root.winfo_exists():
-                if hasattr(self.launcher.main_tab, 'launch_button'):
-                    self.launcher.root.after(0, lambda: self.launcher.main_tab.launch_button.config(state="normal"))
-                if hasattr(self.launcher.main_tab, 'install_button'):
-                    self.launcher.root.after(0, lambda: self.launcher.main_tab.install_button.config(state="normal"))
\ No newline at end of file
+            with self._running_lock:
+                self.running_game_dirs.discard(game_dir)
+            self._enable_launch_buttons()
+
+    def _enable_launch_buttons(self):
+        """Кнопки снова доступны: процесс запущен, другие папки игры можно запускать"""
+        if self.launcher.root.winfo_exists():
+            if hasattr(self.launcher.main_tab, 'launch_button'):
+                self.launcher.root.after(0, lambda: self.launcher.main_tab.launch_button.config(state="normal"))
+            if hasattr(self.launcher.main_tab, 'install_button'):
+                self.launcher.root.after(0, lambda: self.launcher.main_tab.install_button.config(state="normal"))
\ No newline at end of file